@@ -1,7 +1,24 @@
+import os
 import sys
-sys.path.append("..")
+import time
+
+# Cold start timing starts before anything else is imported
+IMPORT_START = time.perf_counter()
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+# Serve from the precomputed bundle (python bundle.py) so a cold start never imports Chroma,
+# sentence-transformers or torch; the models and index load lazily on the first chat
+os.environ.setdefault("ARTIFACT_BUNDLE", os.path.join(ROOT, "bundle"))
+
+# bundle/ isn't committed; without it every chat, search and suggest call would fail, so
+# refuse to start instead
+if not os.path.exists(os.path.join(os.environ["ARTIFACT_BUNDLE"], "manifest.json")):
+    raise RuntimeError(f"No artifact bundle at {os.environ['ARTIFACT_BUNDLE']}; build it with "
+                       "`python inference_backend.py export && python bundle.py` before deploying")
+
 from flask_api import app
+from metrics import record_startup
 
-# Vercel requires a handler
-def handler(request):
-    return app(request) 
\ No newline at end of file
+record_startup("import", time.perf_counter() - IMPORT_START)
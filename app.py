@@ -2,14 +2,14 @@ __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import streamlit as st
-import chromadb
-from chromadb.utils import embedding_functions
 import numpy as np
-from sentence_transformers import CrossEncoder
-from huggingface_hub import InferenceClient
 import os
+from collections import OrderedDict
 from typing import List, Tuple
 
+from model_registry import get_registry
+from retrieval import VectorDBQuery, format_documents
+
 # from load_dotenv import load_dotenv
 
 # load_dotenv()
@@ -39,52 +39,48 @@ IMPORTANT: At the beginning, write a short sentence summarizing your answer and
 DO NOT PROVIDE MORE UNRELATED INFORMATION THAN NECESSARY.
 """
 
-# read articles.txt to get article titles
-article_titles = [article for article in open("articles.txt").read().split("\n") if article]
-
-class VectorDBQuery:
-    def __init__(self, db_path="./vector_db_new"):
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        self.collection = self.chroma_client.get_collection(
-            name="thoughtco_articles",
-            embedding_function=self.embedding_function
-        )
-
-    def search_similar(self, query_text: str, n_results: int = 10, n_rerank: int = 3) -> List[Tuple]:
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
-
-        if results['distances'][0]:
-            max_distance = max(results['distances'][0])
-            similarities = [100 * (1 - (dist / max_distance)) for dist in results['distances'][0]]
-            print(similarities)
-        else:
-            similarities = []
-        
-        documents = results['documents'][0]
-        metadatas = results['metadatas'][0]
-        
-        pairs = [[query_text, doc] for doc in documents]
-        cross_scores = self.cross_encoder.predict(pairs)
-        
-        ranked_results = list(zip(cross_scores, metadatas, documents, similarities))
-        ranked_results.sort(reverse=True)
-        
-        top_results = ranked_results[:n_rerank]
-        
-        return [(metadata, document, similarities) 
-                for score, metadata, document, similarities in top_results]
+# "article" or "passage" retrieval, see retrieval.VectorDBQuery
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "article")
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "").lower() in ("1", "true", "yes")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Questions per session whose retrieval results are kept for reuse
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "32"))
+
+# Streamlit reruns this script on every interaction; the loaders below run once per server
+# process and their results are shared by all sessions
+
+@st.cache_data
+def load_article_titles(modified_at):
+    # read articles.txt to get article titles; keyed on the file's mtime so titles the
+    # scraper appends show up
+    return [article for article in open("articles.txt").read().split("\n") if article]
+
+@st.cache_resource(show_spinner="Loading models...")
+def load_db_query():
+    """Embedding and cross encoder models, collection and caches behind one shared VectorDBQuery"""
+    return VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+
+@st.cache_resource
+def load_llm_helper():
+    return HuggingFaceHelper()
+
+def search_documents(db_query, question):
+    """Retrieval results for the question, reused when it is asked again in this session"""
+    cache = st.session_state.setdefault('retrieval_cache', OrderedDict())
+    key = question.strip()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    results = db_query.search_similar(question, n_results=10, n_rerank=3)
+    cache[key] = results
+    if len(cache) > RETRIEVAL_CACHE_SIZE:
+        cache.popitem(last=False)
+    return results
 
 class HuggingFaceHelper:
     def __init__(self):
-        self.client = InferenceClient(api_key=os.getenv("HUGGINGFACE_API_KEY"))
+        self.client = get_registry().get_inference_client()
         self.model = "meta-llama/Meta-Llama-3-8B-Instruct"
 
     def generate_response(self, question: str, context: str, system_prompt: str) -> str:
@@ -130,14 +126,6 @@ class HuggingFaceHelper:
         except Exception as e:
             return f"Error generating response: {str(e)}"
 
-def format_documents(results: List[Tuple]) -> str:
-    context = ""
-    for metadata, document, similarity in results:
-        context += f"\nTitle: {metadata['title']}\n"
-        context += f"Content: {document}\n"
-        context += f"Source: {metadata['url']}\n\n"
-    return context
-
 def main():
     global system_prompt
     st.set_page_config(page_title="AI Thought Co Chat Assistant")
@@ -149,17 +137,17 @@ def main():
     system_prompt = st.text_area("System Prompt", system_prompt, height=100)
     # Add an option to see article titles
     with st.expander("📚 Titles in Database"):
-        for title in article_titles:
-            st.write(title)
+        # One element instead of one per title keeps reruns cheap
+        st.markdown("\n".join(f"- {title}" for title in load_article_titles(os.path.getmtime("articles.txt"))))
 
     # Check for API key
     if not os.getenv("HUGGINGFACE_API_KEY"):
         st.error("Please set your HUGGINGFACE_API_KEY environment variable!")
         st.stop()
 
-    # Initialize components
-    db_query = VectorDBQuery()
-    llm_helper = HuggingFaceHelper()
+    # Shared components, loaded on the first run only
+    db_query = load_db_query()
+    llm_helper = load_llm_helper()
 
     # Session state for chat history
     if 'chat_history' not in st.session_state:
@@ -173,8 +161,8 @@ def main():
         st.session_state['chat_history'].append({"role": "user", "content": user_question})
         with st.spinner("Searching relevant documents..."):
             # Search for relevant documents
-            results = db_query.search_similar(user_question, n_results=10, n_rerank=3)
-            context = format_documents(results)
+            results = search_documents(db_query, user_question)
+            context = format_documents(db_query.compress_context(user_question, results))
 
         # Generate LLM response with streaming
         response_placeholder = st.chat_message("assistant").empty()
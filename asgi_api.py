@@ -0,0 +1,311 @@
+import os
+# Chroma needs a newer sqlite3 than some hosts ship; the artifact bundle doesn't use Chroma
+if not os.getenv("ARTIFACT_BUNDLE"):
+    __import__('pysqlite3')
+    import sys
+    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import anyio
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from chat_service import (
+    RETRIEVAL_MODE, HYBRID_RETRIEVAL, VECTOR_BACKEND, system_prompt, start_turn, finish_turn,
+    get_conversation, prompt_history, format_sources, sse_event, read_batch_request,
+    read_search_request, search_page, suggest_titles
+)
+from metrics import metrics, start_trace, finish_trace, server_timing
+from model_registry import get_registry
+from retrieval import VectorDBQuery, format_documents
+
+# Embedding, vector search and reranking are CPU-bound, so they run on a bounded
+# pool instead of the event loop; the LLM call is awaited directly
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_WORKERS", "4")),
+    thread_name_prefix="retrieval"
+)
+
+
+def get_llm():
+    """The Hugging Face client, or the offline stand-in when FAKE_LLM is set"""
+    if os.getenv("FAKE_LLM", "").lower() in ("1", "true", "yes"):
+        from fake_llm import FakeAsyncLLM
+        return FakeAsyncLLM()
+    from llm import AsyncHuggingFaceHelper
+    return AsyncHuggingFaceHelper()
+
+
+def search(user_question):
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    results = db_query.search_similar(user_question, n_results=10, n_rerank=3)
+    return results, format_documents(db_query.compress_context(user_question, results))
+
+
+async def run_search(user_question):
+    return await run_retrieval(search, user_question)
+
+
+async def run_retrieval(function, *args):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of this context so the stages land in the request's trace
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(retrieval_executor, functools.partial(context.run, function, *args))
+
+
+async def read_chat_request(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    return data.get('question'), data.get('session_id'), data.get('since')
+
+
+def begin_turn(session_id, user_question):
+    session_id = start_turn(session_id, user_question)
+    return session_id, prompt_history(session_id)
+
+
+async def start_session_turn(session_id, user_question):
+    """
+    Record the question and read the prompt history off the event loop: with SESSION_STORE=sqlite
+    a contended write can wait on the lock, which would otherwise stall every request and stream
+    """
+    return await run_in_threadpool(begin_turn, session_id, user_question)
+
+
+async def chat(request):
+    user_question, session_id, since = await read_chat_request(request)
+    if not user_question:
+        return JSONResponse({"error": "Question is required."}, status_code=400)
+    if since is not None and not isinstance(since, int):
+        return JSONResponse({"error": "since must be an integer."}, status_code=400)
+
+    session_id, (history, summary) = await start_session_turn(session_id, user_question)
+
+    # Search for relevant documents
+    results, context = await run_search(user_question)
+
+    # Generate response from LLM
+    llm_response = await get_llm().generate_response(
+        question=user_question,
+        context=context,
+        system_prompt=system_prompt,
+        history=history,
+        summary=summary
+    )
+
+    await run_in_threadpool(finish_turn, session_id, llm_response)
+    conversation = await run_in_threadpool(get_conversation, session_id, since)
+
+    return JSONResponse({
+        "session_id": session_id,
+        **conversation,
+        "sources": format_sources(results)
+    })
+
+
+async def chat_stream(request):
+    """Async version of the Flask /api/chat/stream endpoint"""
+    request_start = time.perf_counter()
+
+    user_question, session_id, _ = await read_chat_request(request)
+    if not user_question:
+        return JSONResponse({"error": "Question is required."}, status_code=400)
+
+    session_id, (history, summary) = await start_session_turn(session_id, user_question)
+    results, context = await run_search(user_question)
+
+    async def generate():
+        yield sse_event("sources", {"session_id": session_id, "sources": format_sources(results)})
+
+        tokens = []
+        time_to_first_token = None
+        completed = False
+        token_stream = get_llm().stream_response(
+            question=user_question,
+            context=context,
+            system_prompt=system_prompt,
+            history=history,
+            summary=summary
+        )
+        try:
+            async for token in token_stream:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - request_start
+                tokens.append(token)
+                yield sse_event("token", {"token": token})
+            completed = True
+        except Exception as e:
+            yield sse_event("error", {"error": f"Error generating response: {str(e)}"})
+        finally:
+            # Starlette cancels this generator when the client disconnects
+            await token_stream.aclose()
+            if tokens:
+                # Still saved when the stream was cancelled by a disconnect
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(finish_turn, session_id, "".join(tokens))
+
+        if completed:
+            yield sse_event("done", {
+                "time_to_first_token": time_to_first_token,
+                "total_time": time.perf_counter() - request_start,
+                "tokens": len(tokens)
+            })
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def search_ranked(options):
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    return db_query.search_similar(options["query"], n_results=options["n_results"],
+                                   n_rerank=options["n_results"], rerank=options["rerank"])
+
+
+async def search_articles(request):
+    """Async version of the Flask /api/search endpoint"""
+    if request.method == "POST":
+        try:
+            data = await request.json()
+        except ValueError:
+            data = {}
+    else:
+        data = dict(request.query_params)
+    try:
+        options = read_search_request(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    start = time.perf_counter()
+    results = await run_retrieval(search_ranked, options)
+    return JSONResponse({**search_page(results, options), "took_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+
+def search_many(queries, n_results, n_rerank):
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    return db_query.search_batch(queries, n_results=n_results, n_rerank=n_rerank)
+
+
+async def search_batch(request):
+    """Async version of the Flask /api/search/batch endpoint"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    try:
+        queries, n_results, n_rerank = read_batch_request(data)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    start = time.perf_counter()
+    results = await run_retrieval(search_many, queries, n_results, n_rerank)
+    elapsed = time.perf_counter() - start
+    return JSONResponse({
+        "results": [{"query": query, "sources": format_sources(query_results)}
+                    for query, query_results in zip(queries, results)],
+        "queries_per_sec": round(len(queries) / elapsed, 2) if elapsed else None
+    })
+
+
+def suggest_from_index(data):
+    return suggest_titles(get_registry().get_suggest_index(), data)
+
+
+async def suggest(request):
+    """Async version of the Flask /api/suggest endpoint"""
+    try:
+        # On a thread since the first call builds the index and refreshes may re-read the collection
+        return JSONResponse(await run_retrieval(suggest_from_index, dict(request.query_params)))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+async def hello(request):
+    return JSONResponse({"message": "Hello, World!"})
+
+
+async def ready(request):
+    status = get_registry().status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def prometheus_metrics(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class TraceMiddleware:
+    """Gives every request a trace id (X-Trace-Id, reused from the request if sent) and a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        trace, token = start_trace(headers.get(b"x-trace-id", b"").decode() or None)
+        path = scope["path"]
+        endpoint = path if path in ROUTE_PATHS else "unmatched"
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace["id"].encode()),
+                    (b"server-timing", server_timing(trace).encode())
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            finish_trace(trace, token, endpoint, status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if os.getenv("WARM_UP_MODELS", "").lower() in ("1", "true", "yes"):
+        get_registry().warm_up(background=True)
+    yield
+    retrieval_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/chat/stream', chat_stream, methods=['POST']),
+        Route('/api/search', search_articles, methods=['GET', 'POST']),
+        Route('/api/search/batch', search_batch, methods=['POST']),
+        Route('/api/suggest', suggest, methods=['GET']),
+        Route('/api/hello', hello, methods=['GET']),
+        Route('/api/ready', ready, methods=['GET']),
+        Route('/api/metrics', prometheus_metrics, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(TraceMiddleware),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["X-Trace-Id", "Server-Timing"])
+    ],
+    lifespan=lifespan
+)
+ROUTE_PATHS = {route.path for route in app.routes}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
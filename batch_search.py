@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+import time
+
+from chat_service import RETRIEVAL_MODE, HYBRID_RETRIEVAL, VECTOR_BACKEND, format_sources
+from retrieval import VectorDBQuery
+
+
+def read_queries(path):
+    """Rows of a JSONL file with a "query" field (plain strings are accepted too); other fields are passed through"""
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [row if isinstance(row, dict) else {"query": row} for row in rows]
+
+
+def run_batches(db_query, rows, output, batch_size=32, n_results=10, n_rerank=3):
+    """Search every row in batches and write one JSONL line per query; returns queries/sec"""
+    start = time.perf_counter()
+    done = 0
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        results = db_query.search_batch([row["query"] for row in batch], n_results=n_results, n_rerank=n_rerank)
+        for row, query_results in zip(batch, results):
+            output.write(json.dumps({**row, "results": format_sources(query_results)}) + "\n")
+        done += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"{done}/{len(rows)} queries ({done / elapsed:.1f} queries/sec)", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    return len(rows) / elapsed if elapsed else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of queries through retrieval and reranking")
+    parser.add_argument("input", help="JSONL file with a \"query\" field per line")
+    parser.add_argument("--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries embedded, searched and reranked together")
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--n-rerank", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = read_queries(args.input)
+    db_query = VectorDBQuery(args.db_path, mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        rate = run_batches(db_query, rows, output, args.batch_size, args.n_results, args.n_rerank)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Searched {len(rows)} queries at {rate:.1f} queries/sec", file=sys.stderr)
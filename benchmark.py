@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_service import RETRIEVAL_MODE, HYBRID_RETRIEVAL, VECTOR_BACKEND, system_prompt
+from fake_llm import FakeLLM
+from llm import build_messages
+from load_test import percentile
+from model_registry import INFERENCE_BACKEND
+from retrieval import VectorDBQuery, format_documents
+
+# Articles passed to the LLM, as in the API
+CONTEXT_ARTICLES = 3
+
+STAGES = ("embed", "vector_search", "rerank", "compress_context", "prompt_build", "time_to_first_token",
+          "generation", "total")
+
+
+# Hand-labeled questions worded differently from the titles, each with the titles of the
+# articles that answer it
+QUERIES_FILE = "benchmark_queries.jsonl"
+
+
+def title_key(title):
+    return " ".join(title.split()).casefold()
+
+
+def load_labeled_queries(path=QUERIES_FILE, db_query=None, limit=50, title_smoke_test=False):
+    """
+    Labeled queries as [{"query": ..., "urls": [...]}]. From a JSONL file with a "query" and a
+    "url", "urls" or "titles" field per line; titles are looked up in the collection. With
+    title_smoke_test, the titles of the first `limit` stored articles (by URL) are used as
+    queries for their own articles instead, which only checks that retrieval works: a query
+    that is the title finds its article, so recall and MRR come out inflated.
+    """
+    metadatas = db_query.collection.get(include=["metadatas"])['metadatas']
+    if title_smoke_test:
+        articles = sorted({metadata['url']: metadata['title'] for metadata in metadatas}.items())
+        return [{"query": title, "urls": [url]} for url, title in articles[:limit]]
+
+    urls_by_title = {title_key(metadata['title']): metadata['url'] for metadata in metadatas}
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    labeled = []
+    missing = []
+    for row in rows:
+        urls = row.get("urls") or ([row["url"]] if "url" in row else [])
+        for title in row.get("titles", []):
+            if title_key(title) in urls_by_title:
+                urls.append(urls_by_title[title_key(title)])
+            else:
+                missing.append(title)
+        if urls:
+            labeled.append({"query": row["query"], "urls": urls})
+    if missing:
+        print(f"{len(missing)} labeled articles aren't in the collection, e.g. {missing[0]!r}; "
+              f"{len(rows) - len(labeled)} queries left out", file=sys.stderr)
+    return labeled[:limit]
+
+
+def run_pipeline(db_query, llm, question, n_results):
+    """One request through retrieval, prompt building and generation; returns (results, timings)"""
+    timings = {}
+    request_start = time.perf_counter()
+    results = db_query.search_similar(question, n_results=n_results, n_rerank=n_results, timings=timings)
+
+    compressed, report = db_query.compressor.compress(question, results[:CONTEXT_ARTICLES], timings)
+    timings["compression_ratio"] = report["ratio"]
+
+    start = time.perf_counter()
+    context = format_documents(compressed)
+    build_messages(question, context, system_prompt)
+    timings["prompt_build"] = time.perf_counter() - start
+
+    if llm is not None:
+        start = time.perf_counter()
+        for index, _ in enumerate(llm.stream_response(question, context, system_prompt)):
+            if index == 0:
+                timings["time_to_first_token"] = time.perf_counter() - start
+        timings["generation"] = time.perf_counter() - start
+
+    timings["total"] = time.perf_counter() - request_start
+    return results, timings
+
+
+def dense_urls(db_query, question, n_results):
+    """Article URLs in vector search order, before fusion and reranking"""
+    collection = db_query.passage_collection if db_query.mode == "passage" else db_query.collection
+    results = collection.query(query_embeddings=db_query.query_cache.embed([question]),
+                               n_results=n_results, include=["metadatas"])
+    return list(dict.fromkeys(metadata['url'] for metadata in results['metadatas'][0]))
+
+
+def ranking_quality(rankings, labels, ks):
+    """Mean recall@k for each k, and MRR, of ranked URL lists against the labeled URLs"""
+    recall = {k: [] for k in ks}
+    reciprocal_ranks = []
+    for urls, relevant in zip(rankings, labels):
+        relevant = set(relevant)
+        for k in ks:
+            recall[k].append(len(relevant & set(urls[:k])) / len(relevant))
+        rank = next((index + 1 for index, url in enumerate(urls) if url in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    quality = {f"recall@{k}": round(statistics.mean(values), 4) for k, values in recall.items()}
+    quality["mrr"] = round(statistics.mean(reciprocal_ranks), 4)
+    return quality
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds for each stage"""
+    summary = {}
+    for stage in STAGES:
+        values = [timings[stage] * 1000 for timings in samples if stage in timings]
+        if values:
+            summary[stage] = {
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "mean": round(statistics.mean(values), 3)
+            }
+    return summary
+
+
+def clear_caches(db_query):
+    db_query.query_cache.clear()
+    if db_query.reranker.cache is not None:
+        db_query.reranker.cache.clear()
+
+
+def measure_throughput(db_query, llm, questions, concurrency, total, n_results):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        samples = list(executor.map(
+            lambda index: run_pipeline(db_query, llm, questions[index % len(questions)], n_results)[1],
+            range(total)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies = [timings["total"] * 1000 for timings in samples]
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_sec": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(db_query, llm, labeled, n_results=10, ks=(1, 3, 5, 10), concurrency_levels=(1, 4, 16),
+                  requests_per_level=None, warm_caches=False, query_set=QUERIES_FILE):
+    questions = [row["query"] for row in labeled]
+    labels = [row["urls"] for row in labeled]
+
+    # Load the models before timing anything
+    run_pipeline(db_query, None, questions[0], n_results)
+    if not warm_caches:
+        clear_caches(db_query)
+
+    print(f"Running {len(questions)} queries one at a time", file=sys.stderr)
+    samples = []
+    reranked = []
+    for question in questions:
+        results, timings = run_pipeline(db_query, llm, question, n_results)
+        samples.append(timings)
+        reranked.append([metadata['url'] for metadata, _, _ in results])
+    dense = [dense_urls(db_query, question, n_results) for question in questions]
+
+    throughput = []
+    for concurrency in concurrency_levels:
+        if not warm_caches:
+            clear_caches(db_query)
+        total = requests_per_level or max(len(questions), 2 * concurrency)
+        print(f"Running {total} requests at concurrency {concurrency}", file=sys.stderr)
+        throughput.append(measure_throughput(db_query, llm, questions, concurrency, total, n_results))
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "retrieval_mode": db_query.mode,
+            "hybrid": db_query.bm25_index is not None,
+            "vector_backend": type(db_query.collection).__name__,
+            "inference_backend": INFERENCE_BACKEND,
+            "vector_quantization": os.getenv("VECTOR_QUANTIZATION", "none"),
+            "n_results": n_results,
+            "context_token_budget": db_query.compressor.token_budget,
+            "queries": len(questions),
+            "query_set": query_set,
+            "warm_caches": warm_caches,
+            "fake_llm": None if llm is None else {
+                "time_to_first_token": llm.time_to_first_token,
+                "tokens_per_sec": llm.tokens_per_sec
+            }
+        },
+        "latency_ms": summarize(samples),
+        "context_compression_ratio": round(statistics.mean(timings["compression_ratio"] for timings in samples), 4),
+        "quality": {
+            "dense": ranking_quality(dense, labels, ks),
+            "reranked": ranking_quality(reranked, labels, ks)
+        },
+        "throughput": throughput
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput and quality")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--queries", default=QUERIES_FILE,
+                        help="JSONL file of labeled queries ({\"query\": ..., \"urls\" or \"titles\": [...]})")
+    parser.add_argument("--title-smoke-test", action="store_true",
+                        help="Query each article by its own title instead; a smoke test, its recall and MRR are inflated")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of queries")
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, help="Requests per concurrency level")
+    parser.add_argument("--fake-ttft", type=float, default=0.3, help="Fake LLM time to first token (seconds)")
+    parser.add_argument("--fake-tokens-per-sec", type=float, default=50)
+    parser.add_argument("--no-generation", action="store_true", help="Leave out the fake LLM")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep the query and rerank caches between runs")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    db_query = VectorDBQuery(args.db_path, mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    llm = None if args.no_generation else FakeLLM(args.fake_ttft, args.fake_tokens_per_sec)
+    labeled = load_labeled_queries(args.queries, db_query, args.limit, args.title_smoke_test)
+    if not labeled:
+        sys.exit("No queries to run; none of the labeled articles are in the collection")
+
+    report = run_benchmark(db_query, llm, labeled, args.n_results, concurrency_levels=args.concurrency,
+                           requests_per_level=args.requests, warm_caches=args.warm_caches,
+                           query_set="title-smoke-test" if args.title_smoke_test else args.queries)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Wrote {args.output}", file=sys.stderr)
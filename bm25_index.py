@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+# Common words that carry no signal for matching article terms
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the their this
+to was were what when where which who why will with does do did you your can about into than
+""".split())
+
+INDEX_DIR = "bm25"
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords or single characters ("Wernicke's" -> "wernicke")"""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring, stored as a handful of flat numpy arrays.
+
+    Postings of all terms are concatenated into one `postings_docs` / `postings_tf` pair;
+    `offsets[i]:offsets[i + 1]` is the slice for term i. Scoring a query adds each query
+    term's contribution to a dense score vector in one vectorized step per term.
+    """
+
+    def __init__(self, doc_ids, terms, offsets, postings_docs, postings_tf, doc_lengths, k1=1.5, b=0.75):
+        self.doc_ids = doc_ids
+        self.term_index = {term: index for index, term in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_ids)
+        doc_freqs = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # Per-document part of the BM25 denominator, computed once
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / avg_length)).astype(np.float32) if n_docs else doc_lengths
+
+    @classmethod
+    def build(cls, documents):
+        """Build from an iterable of (doc_id, text)"""
+        doc_ids = []
+        doc_lengths = []
+        postings = {}
+        for doc_index, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc_index, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for index, term in enumerate(terms):
+            offsets[index + 1] = offsets[index] + len(postings[term])
+        postings_docs = np.empty(offsets[-1], dtype=np.int32)
+        postings_tf = np.empty(offsets[-1], dtype=np.uint16)
+        for index, term in enumerate(terms):
+            entries = postings[term]
+            postings_docs[offsets[index]:offsets[index + 1]] = [doc for doc, _ in entries]
+            postings_tf[offsets[index]:offsets[index + 1]] = [min(count, 65535) for _, count in entries]
+
+        return cls(doc_ids, terms, offsets, postings_docs, postings_tf,
+                   np.asarray(doc_lengths, dtype=np.float32))
+
+    def scores(self, query_text):
+        """BM25 score of every document for the query"""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in set(tokenize(query_text)):
+            term_index = self.term_index.get(term)
+            if term_index is None:
+                continue
+            start, end = self.offsets[term_index], self.offsets[term_index + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_index] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        return scores
+
+    def search(self, query_text, n_results=10):
+        """Top documents as [(doc_id, score)], best first; documents without any query term are skipped"""
+        scores = self.scores(query_text)
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.doc_ids[index], float(scores[index])) for index in matched]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, "postings.npz"),
+            offsets=self.offsets,
+            postings_docs=self.postings_docs,
+            postings_tf=self.postings_tf,
+            doc_lengths=self.doc_lengths
+        )
+        with open(os.path.join(path, "terms.json"), "w") as f:
+            json.dump({"doc_ids": self.doc_ids, "terms": self.terms, "k1": self.k1, "b": self.b}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "terms.json")) as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(path, "postings.npz"))
+        return cls(meta["doc_ids"], meta["terms"], arrays["offsets"], arrays["postings_docs"],
+                   arrays["postings_tf"], arrays["doc_lengths"], meta["k1"], meta["b"])
+
+
+def build_bm25_index(collection, path):
+    """Index every document of a Chroma collection and save it next to the database"""
+    data = collection.get(include=["documents", "metadatas"])
+    # Titles are repeated so exact title terms weigh a little more
+    index = BM25Index.build(
+        (doc_id, f"{metadata.get('title', '')} {metadata.get('title', '')} {document}")
+        for doc_id, document, metadata in zip(data['ids'], data['documents'], data['metadatas'])
+    )
+    index.save(path)
+    print(f"Saved BM25 index of {len(index.doc_ids)} documents and {len(index.terms)} terms to {path}")
+    return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked lists of doc ids; returns [(doc_id, fused score)] best first"""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    from model_registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Build the BM25 index for the article collection")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    args = parser.parse_args()
+
+    build_bm25_index(get_registry(args.db_path).get_collection(), os.path.join(args.db_path, INDEX_DIR))
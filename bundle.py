@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Everything the API needs to answer without Chroma, sentence-transformers or torch:
+#   manifest.json
+#   embedder/model.onnx, embedder/tokenizer.json
+#   cross_encoder/model.onnx, cross_encoder/tokenizer.json
+#   index/  (a NumpyVectorIndex export of the article collection)
+# Serving it only needs numpy, onnxruntime and tokenizers.
+BUNDLE_DIR = "./bundle"
+MANIFEST_FILE = "manifest.json"
+
+
+def read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def cross_encoder_activation(model_path):
+    """The activation CrossEncoder.predict applies to the logit, sigmoid or identity"""
+    config = read_json(os.path.join(model_path, "config.json"), {})
+    activation = config.get("sentence_transformers", {}).get("activation_fn")
+    if activation is None:
+        # Older sentence-transformers default for single-label models
+        return "sigmoid" if len(config.get("id2label", {"0": ""})) == 1 else "identity"
+    return "sigmoid" if "Sigmoid" in activation else "identity"
+
+
+def build_bundle(db_path, output=BUNDLE_DIR, backend="onnx-int8", dtype="float16"):
+    """Copy the ONNX exports from inference_backend.py and export the article collection into one directory"""
+    from inference_backend import ONNX_MODELS_DIR, export_path, onnx_file_name
+    from model_registry import CROSS_ENCODER_MODEL_NAME, EMBEDDING_MODEL_NAME, get_registry
+    from numpy_index import export_collection
+
+    manifest = {"built_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "backend": backend}
+    for role, model_name in (("embedder", EMBEDDING_MODEL_NAME), ("cross_encoder", CROSS_ENCODER_MODEL_NAME)):
+        source = export_path(model_name, ONNX_MODELS_DIR)
+        model_file = os.path.join(source, onnx_file_name(backend))
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"No ONNX export at {model_file}, run `python inference_backend.py export` first")
+        target = os.path.join(output, role)
+        os.makedirs(target, exist_ok=True)
+        shutil.copyfile(model_file, os.path.join(target, "model.onnx"))
+        shutil.copyfile(os.path.join(source, "tokenizer.json"), os.path.join(target, "tokenizer.json"))
+
+        if role == "embedder":
+            config = read_json(os.path.join(source, "sentence_bert_config.json"), {})
+            manifest[role] = {"model": model_name, "max_length": config.get("max_seq_length", 256)}
+        else:
+            manifest[role] = {"model": model_name, "max_length": 512,
+                              "activation": cross_encoder_activation(source)}
+
+    export_collection(get_registry(db_path).get_collection(), os.path.join(output, "index"), dtype)
+
+    with open(os.path.join(output, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(output) for name in names)
+    print(f"Wrote bundle to {output} ({size / 1e6:.1f} MB)")
+    return manifest
+
+
+def load_manifest(path):
+    manifest = read_json(os.path.join(path, MANIFEST_FILE))
+    if manifest is None:
+        raise FileNotFoundError(f"No artifact bundle at {path}, build one with `python bundle.py`")
+    return manifest
+
+
+class OnnxTextModel:
+    """A tokenizer and an ONNX session, loaded from one bundle directory"""
+
+    def __init__(self, path, max_length, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        threads = int(threads or os.getenv("INFERENCE_THREADS", "0"))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(os.path.join(path, "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def run(self, inputs):
+        """First model output and the attention mask for a batch of texts or text pairs"""
+        encodings = self.tokenizer.encode_batch(inputs)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        attention_mask = feeds["attention_mask"]
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+        return self.session.run(None, feeds)[0], attention_mask
+
+
+class BundleEmbedder(OnnxTextModel):
+    """Mean-pooled, normalized sentence embeddings; callable like a Chroma embedding function"""
+
+    def encode(self, texts):
+        token_embeddings, attention_mask = self.run(list(texts))
+        mask = attention_mask[:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    def __call__(self, input):
+        return [embedding.tolist() for embedding in self.encode(input)]
+
+
+class BundleCrossEncoder(OnnxTextModel):
+    """Scores (query, document) pairs; same predict(pairs) interface as CrossEncoder"""
+
+    def __init__(self, path, max_length, activation="identity", threads=None):
+        super().__init__(path, max_length, threads)
+        self.activation = activation
+
+    def predict(self, pairs):
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=np.float32)
+        logits, _ = self.run([tuple(pair) for pair in pairs])
+        scores = logits[:, 0]
+        return 1 / (1 + np.exp(-scores)) if self.activation == "sigmoid" else scores
+
+
+def load_embedder(path):
+    config = load_manifest(path)["embedder"]
+    return BundleEmbedder(os.path.join(path, "embedder"), config["max_length"])
+
+
+def load_cross_encoder(path):
+    config = load_manifest(path)["cross_encoder"]
+    return BundleCrossEncoder(os.path.join(path, "cross_encoder"), config["max_length"], config["activation"])
+
+
+def load_index(path):
+    from numpy_index import NumpyVectorIndex
+    return NumpyVectorIndex(os.path.join(path, "index"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the artifact bundle served by api/index.py")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--output", default=BUNDLE_DIR)
+    parser.add_argument("--backend", choices=["onnx", "onnx-int8"], default="onnx-int8",
+                        help="Which ONNX export of the models to bundle")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float16")
+    args = parser.parse_args()
+
+    build_bundle(args.db_path, args.output, args.backend, args.dtype)
@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import List, Tuple
+
+from conversation import HISTORY_TOKEN_BUDGET, SUMMARY_TOKEN_BUDGET, build_history_window
+from metrics import Gauge, metrics
+from session_store import create_session_store
+
+# Conversation history, in memory or in a SQLite file shared by workers (SESSION_STORE)
+session_store = create_session_store()
+
+metrics.register(Gauge("thoughtco_sessions", "Chat sessions in the session store",
+                       lambda: {(): len(session_store)}))
+
+""" from load_dotenv import load_dotenv
+
+load_dotenv() """
+
+system_prompt = """
+SYSTEM PROMPT:
+You are an AI assistant for Thought Co tasked with providing answers based on the given context. Your goal is to analyze the information provided and formulate a response with a reading ease of flesch reading score of 80, concise and well-structured response to the question. Sometimes the information might not be sufficient to answer the question fully, in which case you should state this clearly in your response.
+
+context will be passed as "Context:"
+user question will be passed as "Question:"
+
+To answer the question:
+1. Thoroughly analyze the context, identifying key information relevant to the question.
+2. Organize your thoughts and plan your response to ensure a logical flow of information.
+3. Formulate a detailed answer that directly addresses the question, using only the information provided in the context.
+4. Ensure your answer is comprehensive, covering all relevant aspects found in the context.
+5. If the context doesn't contain sufficient information to fully answer the question, state this clearly in your response.
+
+Format your response as follows:
+1. Use clear, concise language.
+2. Organize your answer into paragraphs for readability.
+3. Use bullet points or numbered lists where appropriate to break down complex information.
+4. If relevant, include any headings or subheadings to structure your response.
+5. Ensure proper grammar, punctuation, and spelling throughout your answer.
+
+IMPORTANT: At the beginning, write a short sentence summarizing your answer and then go into detail about it. You don't need to use the sources but it is appreciated.
+DO NOT PROVIDE MORE UNRELATED INFORMATION THAN NECESSARY.
+"""
+
+# "article" or "passage" retrieval, see retrieval.VectorDBQuery
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "article")
+
+# Fuse BM25 and dense candidates before reranking, see bm25_index.py
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "").lower() in ("1", "true", "yes")
+
+# "chroma" or "numpy" exact search over the export from numpy_index.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Largest number of queries accepted by /api/search/batch
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+
+# Fields /api/search can return per result; the document body only when asked for
+SEARCH_FIELDS = ("title", "url", "similarity", "document")
+DEFAULT_SEARCH_FIELDS = ("title", "url", "similarity")
+
+# Largest number of titles /api/suggest returns per keystroke
+MAX_SUGGESTIONS = 20
+
+def start_turn(session_id, user_question):
+    """Record the user's question in their session, creating the session if needed. Returns the session id."""
+    # Cleanup old sessions
+    session_store.cleanup()
+
+    session_id = session_store.ensure(session_id)
+    session_store.append(session_id, "user", user_question)
+    return session_id
+
+def finish_turn(session_id, response_text):
+    """Record the assistant's answer in the session."""
+    session_store.append(session_id, "assistant", response_text)
+
+def get_conversation(session_id, since=None):
+    """
+    Conversation fields for a chat response. With `since` (the number of messages the
+    client already has) only the newer messages are returned.
+    """
+    messages, offset, length = session_store.history_since(session_id, since or 0)
+    return {
+        "conversation": messages,
+        "conversation_offset": offset,
+        "conversation_length": length
+    }
+
+def prompt_history(session_id):
+    """Recent turns and a summary of older ones for the prompt, excluding the question just asked"""
+    history = session_store.history(session_id)[:-1]
+    return build_history_window(
+        history,
+        budget=int(os.getenv("HISTORY_TOKEN_BUDGET", str(HISTORY_TOKEN_BUDGET))),
+        summary_budget=int(os.getenv("SUMMARY_TOKEN_BUDGET", str(SUMMARY_TOKEN_BUDGET)))
+    )
+
+def format_sources(results: List[Tuple]) -> List[dict]:
+    return [{
+        "title": metadata['title'],
+        "url": metadata['url'],
+        "similarity": float(similarity)
+    } for metadata, document, similarity in results]
+
+def read_count(data: dict, name: str, default: int, maximum: int = 100) -> int:
+    """A positive integer request field; raises ValueError with a message for the client"""
+    value = data.get(name, default)
+    # Query string values arrive as text
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= maximum:
+        raise ValueError(f"{name} must be an integer between 1 and {maximum}.")
+    return value
+
+def read_batch_request(data: dict) -> Tuple[List[str], int, int]:
+    """(queries, n_results, n_rerank) of a /api/search/batch body; raises ValueError when invalid"""
+    if not isinstance(data, dict):
+        raise ValueError("The body must be a JSON object.")
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        raise ValueError("queries must be a non-empty list of strings.")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch.")
+    n_results = read_count(data, 'n_results', 10)
+    return queries, n_results, read_count(data, 'n_rerank', 3, n_results)
+
+def read_flag(data: dict, name: str, default: bool) -> bool:
+    value = data.get(name, default)
+    if isinstance(value, str):
+        return value.lower() not in ("0", "false", "no")
+    return bool(value)
+
+def search_cursor_key(query: str, n_results: int, rerank: bool) -> str:
+    """Ties a cursor to the ranking it pages through"""
+    return hashlib.sha1(f"{query}\n{n_results}\n{rerank}".encode("utf-8")).hexdigest()[:12]
+
+def encode_cursor(key: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"k": key, "o": offset}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, key: str) -> int:
+    """Offset stored in a cursor; raises ValueError if it is malformed or from another search"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = data["o"]
+        valid = data["k"] == key and isinstance(offset, int) and offset >= 0
+    except (ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise ValueError("cursor is invalid or belongs to a different search.")
+    return offset
+
+def read_search_request(data: dict) -> dict:
+    """
+    Options of a /api/search request (query string or JSON body): q, n_results, page_size
+    (n_rerank is accepted as an alias), rerank, cursor and fields. Raises ValueError when invalid.
+    """
+    query = data.get('q') or data.get('query')
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("q is required.")
+    n_results = read_count(data, 'n_results', 10)
+    page_size = read_count(data, 'page_size' if 'page_size' in data else 'n_rerank', 3, n_results)
+    rerank = read_flag(data, 'rerank', True)
+
+    fields = data.get('fields') or DEFAULT_SEARCH_FIELDS
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    if not isinstance(fields, (list, tuple)) or not set(fields) <= set(SEARCH_FIELDS):
+        raise ValueError(f"fields must be a subset of {', '.join(SEARCH_FIELDS)}.")
+
+    key = search_cursor_key(query, n_results, rerank)
+    cursor = data.get('cursor')
+    offset = decode_cursor(cursor, key) if cursor else 0
+    return {"query": query, "n_results": n_results, "page_size": page_size, "rerank": rerank,
+            "fields": list(fields), "key": key, "offset": offset}
+
+def search_page(results: List[Tuple], options: dict) -> dict:
+    """One page of ranked results with only the requested fields, and the cursor for the next page"""
+    offset, page_size = options["offset"], options["page_size"]
+    page = []
+    for metadata, document, similarity in results[offset:offset + page_size]:
+        values = {"title": metadata['title'], "url": metadata['url'],
+                  "similarity": float(similarity), "document": document}
+        page.append({field: values[field] for field in options["fields"]})
+    next_offset = offset + page_size
+    return {
+        "query": options["query"],
+        "results": page,
+        "offset": offset,
+        "total_candidates": len(results),
+        "next_cursor": encode_cursor(options["key"], next_offset) if next_offset < len(results) else None
+    }
+
+def suggest_titles(index, data: dict) -> dict:
+    """Titles for the q typed so far, from a suggest_index.SuggestIndex; raises ValueError when invalid"""
+    query = data.get('q', '')
+    if not isinstance(query, str):
+        raise ValueError("q must be a string.")
+    limit = read_count(data, 'limit', 8, MAX_SUGGESTIONS)
+    # Rate-limited, so most keystrokes only do the lookup
+    index.refresh()
+    start = time.perf_counter()
+    suggestions = index.suggest(query, limit)
+    return {"query": query, "suggestions": suggestions, "took_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event; data is JSON so newlines in tokens survive."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
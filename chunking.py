@@ -0,0 +1,79 @@
+import argparse
+
+from ingest import IngestionPipeline
+from model_registry import get_registry
+
+# Sized so a passage stays within the embedder's 256 word-piece window
+# (roughly 1.3 word pieces per whitespace token in these articles)
+PASSAGE_TOKENS = 160
+PASSAGE_OVERLAP = 32
+
+
+def chunk_text(text, max_tokens=PASSAGE_TOKENS, overlap=PASSAGE_OVERLAP):
+    """Split text into overlapping windows of at most max_tokens whitespace tokens"""
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + max_tokens]))
+        if start + max_tokens >= len(words):
+            break
+    return chunks
+
+
+def article_to_passages(article_data, parent_id, max_tokens=PASSAGE_TOKENS, overlap=PASSAGE_OVERLAP):
+    """Turn an article into (id, passage, metadata) records that point back to the parent article"""
+    return [
+        (f"{parent_id}-{index}", passage, {
+            'title': article_data['title'],
+            'url': article_data['url'],
+            'parent_id': parent_id,
+            'chunk_index': index
+        })
+        for index, passage in enumerate(chunk_text(article_data['content'], max_tokens, overlap))
+    ]
+
+
+def make_chunker(max_tokens=PASSAGE_TOKENS, overlap=PASSAGE_OVERLAP):
+    """Chunker callable for IngestionPipeline"""
+    def chunker(article_data, parent_id):
+        return article_to_passages(article_data, parent_id, max_tokens, overlap)
+    return chunker
+
+
+def build_passage_index(db_path="./vector_db_new", max_tokens=PASSAGE_TOKENS,
+                        overlap=PASSAGE_OVERLAP, batch_size=64):
+    """Chunk every article already in the article collection into the passage collection"""
+    registry = get_registry(db_path)
+    articles = registry.get_collection().get(include=["documents", "metadatas"])
+
+    pipeline = IngestionPipeline(
+        collection=registry.get_passage_collection(create=True),
+        embedding_function=registry.get_embedding_function(),
+        id_fn=lambda article_data: article_data['id'],
+        chunker=make_chunker(max_tokens, overlap),
+        batch_size=batch_size
+    )
+    with pipeline:
+        for doc_id, document, metadata in zip(articles['ids'], articles['documents'], articles['metadatas']):
+            pipeline.submit({
+                'id': doc_id,
+                'title': metadata['title'],
+                'url': metadata['url'],
+                'content': document
+            })
+    return pipeline.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the passage collection from the stored articles")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--max-tokens", type=int, default=PASSAGE_TOKENS)
+    parser.add_argument("--overlap", type=int, default=PASSAGE_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    build_passage_index(args.db_path, args.max_tokens, args.overlap, args.batch_size)
@@ -0,0 +1,135 @@
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from conversation import estimate_tokens
+from metrics import Histogram, metrics, timed
+from query_cache import LRUCache
+
+# Tokens of article text kept in the prompt across all retrieved articles
+CONTEXT_TOKEN_BUDGET = 1200
+
+# Sentences shorter than this are merged into the next one (headings, list fragments)
+MIN_SENTENCE_CHARS = 40
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+
+compression_ratio = metrics.register(Histogram(
+    "thoughtco_context_compression_ratio", "Compressed context tokens over original context tokens",
+    (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1)))
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    pending = ""
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        pending = f"{pending} {sentence}".strip() if pending else sentence.strip()
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+
+class ContextCompressor:
+    """
+    Extractive compression of retrieved articles: every sentence is scored by cosine similarity
+    to the question with the retrieval embedder, and the best ones are kept, in reading order,
+    until the token budget is spent. Titles, URLs and similarities are left as they are.
+
+    Args:
+        query_cache: QueryEmbeddingCache used to embed the question (usually already cached by the search)
+        embedding_function: Embedder for the sentences, called with a list of texts
+        token_budget: Tokens of article text to keep; 0 disables compression
+        cache_size: Sentence embeddings kept in memory, since the same articles are retrieved often
+    """
+
+    def __init__(self, query_cache, embedding_function, token_budget=CONTEXT_TOKEN_BUDGET, cache_size=20000):
+        self.query_cache = query_cache
+        self.embedding_function = embedding_function
+        self.token_budget = token_budget
+        self.sentence_cache = LRUCache(max_entries=cache_size)
+
+    def embed_sentences(self, sentences):
+        vectors = [self.sentence_cache.get(sentence) for sentence in sentences]
+        missing = list(dict.fromkeys(sentence for sentence, vector in zip(sentences, vectors) if vector is None))
+        if missing:
+            embedded = dict(zip(missing, self.embedding_function(missing)))
+            for sentence, embedding in embedded.items():
+                self.sentence_cache.put(sentence, np.asarray(embedding, dtype=np.float32))
+            vectors = [vector if vector is not None else np.asarray(embedded[sentence], dtype=np.float32)
+                       for sentence, vector in zip(sentences, vectors)]
+        return np.vstack(vectors)
+
+    def select(self, scores, lengths, document_ids):
+        """Indices of the sentences to keep: each document's best first, then the best overall"""
+        selected = set()
+        used = 0
+        order = np.argsort(-scores)
+        best_per_document = {}
+        for index in order:
+            best_per_document.setdefault(document_ids[index], index)
+        for index in list(best_per_document.values()) + list(order):
+            if index not in selected and used + lengths[index] <= self.token_budget:
+                selected.add(index)
+                used += lengths[index]
+        return selected
+
+    def compress(self, question: str, results: List[Tuple],
+                 timings: Optional[Dict[str, float]] = None) -> Tuple[List[Tuple], Dict]:
+        """
+        Results (metadata, document, similarity) with each document cut down to its selected
+        sentences, and a report with the original and kept token counts, the ratio and the time.
+        """
+        start = time.perf_counter()
+        original_tokens = sum(estimate_tokens(document) for _, document, _ in results)
+        if self.token_budget <= 0 or original_tokens <= self.token_budget:
+            # Counted as uncompressed so the histogram covers every request
+            compression_ratio.observe(1.0)
+            return results, {"original_tokens": original_tokens, "compressed_tokens": original_tokens,
+                             "ratio": 1.0, "seconds": 0.0}
+
+        with timed("compress_context", timings):
+            sentences = []
+            document_ids = []
+            seen = set()
+            for document_id, (_, document, _) in enumerate(results):
+                for sentence in split_sentences(document):
+                    # Repeated boilerplate would otherwise be kept more than once
+                    if sentence not in seen:
+                        seen.add(sentence)
+                        sentences.append(sentence)
+                        document_ids.append(document_id)
+
+            kept = [[] for _ in results]
+            if sentences:
+                question_vector = np.asarray(self.query_cache.embed([question])[0], dtype=np.float32)
+                sentence_vectors = self.embed_sentences(sentences)
+                # Cosine similarity of every sentence to the question in one product
+                norms = np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(question_vector)
+                scores = sentence_vectors @ question_vector / np.maximum(norms, 1e-12)
+                lengths = [estimate_tokens(sentence) for sentence in sentences]
+
+                previous = {}
+                for index in sorted(self.select(scores, lengths, document_ids)):
+                    document_id = document_ids[index]
+                    # Mark where sentences were left out between the kept ones
+                    if kept[document_id] and previous[document_id] != index - 1:
+                        kept[document_id].append("...")
+                    kept[document_id].append(sentences[index])
+                    previous[document_id] = index
+            compressed = [(metadata, " ".join(sentences_kept), similarity)
+                          for (metadata, _, similarity), sentences_kept in zip(results, kept)]
+
+        compressed_tokens = sum(estimate_tokens(document) for _, document, _ in compressed)
+        report = {
+            "original_tokens": original_tokens,
+            "compressed_tokens": compressed_tokens,
+            "ratio": round(compressed_tokens / original_tokens, 4),
+            "seconds": round(time.perf_counter() - start, 4)
+        }
+        compression_ratio.observe(report["ratio"])
+        return compressed, report
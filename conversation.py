@@ -0,0 +1,67 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Recent turns sent verbatim, and the compacted summary of everything older
+HISTORY_TOKEN_BUDGET = 600
+SUMMARY_TOKEN_BUDGET = 150
+
+# Longest excerpt of one older message kept in the summary
+SUMMARY_EXCERPT_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def first_sentence(text: str) -> str:
+    text = " ".join(text.split())
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    return match.group(1) if match else text
+
+
+def split_history(history: List[Dict], budget: int = HISTORY_TOKEN_BUDGET) -> Tuple[List[Dict], List[Dict]]:
+    """Split history into (older, recent) where recent is the longest suffix within the token budget"""
+    used = 0
+    start = len(history)
+    while start > 0:
+        cost = estimate_tokens(history[start - 1]["content"])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    return history[:start], history[start:]
+
+
+def summarize_turns(turns: List[Dict], budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Compact older turns into a short summary without another LLM call: one line per message
+    with its first sentence. When the lines don't fit the budget the oldest ones are dropped,
+    so the summary rolls forward with the conversation and never grows past the budget.
+    """
+    lines = []
+    used = 0
+    for turn in reversed(turns):
+        speaker = "User asked" if turn["role"] == "user" else "Assistant answered"
+        line = f"- {speaker}: {truncate_to_tokens(first_sentence(turn['content']), SUMMARY_EXCERPT_TOKENS)}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(reversed(lines))
+
+
+def build_history_window(history: List[Dict], budget: int = HISTORY_TOKEN_BUDGET,
+                         summary_budget: int = SUMMARY_TOKEN_BUDGET) -> Tuple[List[Dict], Optional[str]]:
+    """Return (recent turns to send verbatim, summary of the older turns or None)"""
+    older, recent = split_history(history, budget)
+    summary = summarize_turns(older, summary_budget) if older else None
+    return recent, summary or None
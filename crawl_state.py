@@ -0,0 +1,160 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+STATE_FILE = "crawl_state.sqlite3"
+
+
+def stable_id(url):
+    """Document id derived from the article URL, the same in every process and run"""
+    return hashlib.sha1(url.strip().encode("utf-8")).hexdigest()[:20]
+
+
+def content_hash(title, content):
+    return hashlib.sha256(f"{title}\n{content}".encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """
+    What was last stored for each URL: the document id, the HTTP validators (ETag and
+    Last-Modified) to send with conditional GETs, and a hash of the extracted text so an
+    unchanged page isn't embedded again even when the server ignores the validators.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    checked_at REAL NOT NULL
+                )
+            """)
+
+    def get(self, url):
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def save(self, url, doc_id, etag, last_modified, content_hash, changed=True):
+        """Record a fetched page; stored_at only moves when the content changed"""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("""
+                INSERT INTO pages (url, doc_id, etag, last_modified, content_hash, stored_at, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    doc_id = excluded.doc_id,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    stored_at = CASE WHEN ? THEN excluded.stored_at ELSE pages.stored_at END,
+                    checked_at = excluded.checked_at
+            """, (url, doc_id, etag, last_modified, content_hash, now, now, changed))
+
+    def touch(self, url):
+        """Record that the page was checked and hadn't changed"""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE pages SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def delete(self, url):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def urls(self, checked_before=None):
+        """Known URLs, least recently checked first"""
+        query = "SELECT url FROM pages"
+        params = ()
+        if checked_before is not None:
+            query += " WHERE checked_at < ?"
+            params = (checked_before,)
+        with self.lock:
+            rows = self.connection.execute(query + " ORDER BY checked_at", params).fetchall()
+        return [row["url"] for row in rows]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+
+class CrawlCheckpoint:
+    """
+    Saved progress of a crawl: the queued frontier with priorities and the status of every URL
+    handled so far ("stored", "skipped" or "failed"). Each save replaces the previous snapshot in
+    one transaction, so an interrupted save leaves the last complete checkpoint in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            # Queued URLs and handled URLs are kept apart: a URL that was in flight when the
+            # checkpoint was saved is queued again even if it already has a status
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_queue (
+                    url TEXT PRIMARY KEY,
+                    priority INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS crawl_status (url TEXT PRIMARY KEY, status TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS crawl_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def save(self, start_url, queued, statuses):
+        """queued is [(priority, url)], statuses is {url: status}"""
+        with self.lock, self.connection:
+            self._delete()
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO crawl_queue (url, priority) VALUES (?, ?)",
+                [(url, priority) for priority, url in queued]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO crawl_status (url, status) VALUES (?, ?)",
+                list(statuses.items())
+            )
+            self.connection.executemany("INSERT INTO crawl_meta (key, value) VALUES (?, ?)", [
+                ("start_url", start_url),
+                ("saved_at", str(time.time()))
+            ])
+
+    def load(self, start_url):
+        """The saved crawl from start_url as a dict (queued, statuses, articles_stored), or None"""
+        with self.lock:
+            meta = dict(self.connection.execute("SELECT key, value FROM crawl_meta").fetchall())
+            if meta.get("start_url") != start_url:
+                return None
+            queued = self.connection.execute("SELECT priority, url FROM crawl_queue").fetchall()
+            statuses = self.connection.execute("SELECT url, status FROM crawl_status").fetchall()
+        statuses = dict(statuses)
+        return {
+            "queued": sorted(queued),
+            "statuses": statuses,
+            "articles_stored": sum(status == "stored" for status in statuses.values())
+        }
+
+    def mark_stored(self, url):
+        """
+        Record that a queued article has been written. Called from the ingestion writer thread,
+        so an article written after the last save (e.g. while the pipeline flushes) isn't refetched.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM crawl_queue WHERE url = ?", (url,))
+            self.connection.execute("INSERT OR REPLACE INTO crawl_status (url, status) VALUES (?, 'stored')", (url,))
+
+    def _delete(self):
+        self.connection.execute("DELETE FROM crawl_queue")
+        self.connection.execute("DELETE FROM crawl_status")
+        self.connection.execute("DELETE FROM crawl_meta")
+
+    def clear(self):
+        with self.lock, self.connection:
+            self._delete()
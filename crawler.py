@@ -0,0 +1,326 @@
+import heapq
+import threading
+from collections import deque
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class HostRateLimiter:
+    """One token bucket per host so a single site is never hit faster than the configured rate"""
+
+    def __init__(self, requests_per_second=2.0, burst=2):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+        bucket.acquire()
+
+
+class Frontier:
+    """Priority queue of URLs to crawl; lower priority values are crawled first"""
+
+    def __init__(self):
+        self.heap = []
+        self.seen = set()
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def push(self, url, priority=0):
+        """Queue a URL unless it has been queued before. Returns True if it was added."""
+        with self.lock:
+            if url in self.seen:
+                return False
+            self.seen.add(url)
+            # The counter keeps insertion order stable for equal priorities
+            heapq.heappush(self.heap, (priority, self.counter, url))
+            self.counter += 1
+            return True
+
+    def pop(self):
+        """Return (priority, url) for the next URL, or None if the frontier is empty"""
+        with self.lock:
+            if not self.heap:
+                return None
+            priority, _, url = heapq.heappop(self.heap)
+            return priority, url
+
+    def requeue(self, url, priority=0):
+        """Put back a URL that was popped but not crawled"""
+        with self.lock:
+            self.seen.add(url)
+            heapq.heappush(self.heap, (priority, self.counter, url))
+            self.counter += 1
+
+    def items(self):
+        """Queued (priority, url) pairs in crawl order"""
+        with self.lock:
+            return [(priority, url) for priority, _, url in sorted(self.heap)]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.heap)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class CrawlStats:
+    """Counters for a crawl run; articles_stored includes those stored before a resume"""
+
+    def __init__(self, resumed_articles=0):
+        self.start_time = time.perf_counter()
+        self.pages_fetched = 0
+        self.articles_stored = resumed_articles
+        self.resumed_articles = resumed_articles
+        self.errors = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    @property
+    def pages_per_sec(self):
+        elapsed = self.elapsed
+        return self.pages_fetched / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def articles_per_sec(self):
+        elapsed = self.elapsed
+        return (self.articles_stored - self.resumed_articles) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, max_articles):
+        """Estimated seconds until max_articles are stored, at this run's rate"""
+        rate = self.articles_per_sec
+        if rate <= 0:
+            return None
+        return max(0, max_articles - self.articles_stored) / rate
+
+    def progress(self, max_articles):
+        return (f"Processed {self.articles_stored}/{max_articles} articles "
+                f"({self.pages_per_sec:.2f} pages/sec, ETA {format_duration(self.eta(max_articles))})")
+
+    def as_dict(self):
+        return {
+            "pages_fetched": self.pages_fetched,
+            "articles_stored": self.articles_stored,
+            "errors": self.errors,
+            "resumed_articles": self.resumed_articles,
+            "elapsed_sec": round(self.elapsed, 3),
+            "pages_per_sec": round(self.pages_per_sec, 3),
+            "articles_per_sec": round(self.articles_per_sec, 3)
+        }
+
+
+def make_session(headers=None, pool_size=10):
+    """Create a requests session with a keep-alive connection pool sized for the worker count"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class ConcurrentCrawler:
+    """
+    Crawl pages with a thread pool, a per-host rate limit and a priority frontier.
+
+    Args:
+        fetch_page: Callable (url, session) -> (article_data, links), e.g. ThoughtCoScraper.scrape_page;
+            article_data is None when the fetch failed
+        store_article: Callable (article_data, on_stored) called from the coordinating thread for each
+            kept article; on_stored() is called, from any thread, once the article is written
+        max_workers: Number of concurrent fetches
+        requests_per_second: Per-host request rate (0 disables rate limiting)
+        burst: Number of requests a host may receive back to back
+        min_content_length: Articles with shorter content are not stored or expanded
+        checkpoint: Optional crawl_state.CrawlCheckpoint to resume from and save progress to
+        checkpoint_interval: Seconds between checkpoint saves
+    """
+
+    def __init__(self, fetch_page, store_article, max_workers=8, requests_per_second=2.0,
+                 burst=2, min_content_length=100, headers=None, checkpoint=None, checkpoint_interval=30.0):
+        self.fetch_page = fetch_page
+        self.store_article = store_article
+        self.max_workers = max_workers
+        self.min_content_length = min_content_length
+        self.rate_limiter = HostRateLimiter(requests_per_second, burst)
+        self.session = make_session(headers, pool_size=max_workers)
+        self.frontier = Frontier()
+        self.visited_urls = set()
+        self.stats = CrawlStats()
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        # "stored", "skipped" or "failed" for every URL handled so far
+        self.url_status = {}
+        # Articles handed to store_article but not written yet, {url: depth}; checkpointed as queued
+        self.pending_writes = {}
+        # URLs confirmed by on_stored (possibly on a writer thread), applied by the coordinating thread
+        self.written = deque()
+
+    def _fetch(self, url):
+        self.rate_limiter.acquire(url)
+        return self.fetch_page(url, session=self.session)
+
+    def crawl(self, start_url, max_articles=300, progress_every=10):
+        """
+        Crawl from start_url until max_articles are stored or the frontier runs dry. With a
+        checkpoint, a saved crawl from the same start_url is resumed and progress is saved every
+        checkpoint_interval seconds and on exit, including Ctrl-C.
+        """
+        self.stats = CrawlStats()
+        if not self._restore(start_url):
+            self.frontier.push(start_url, priority=0)
+        in_flight = {}
+        last_checkpoint = time.monotonic()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while self.stats.articles_stored < max_articles:
+                    # Keep the pool busy without fetching far more pages than we still need
+                    while (len(in_flight) < self.max_workers
+                           and self.stats.articles_stored + len(in_flight) < max_articles):
+                        item = self.frontier.pop()
+                        if item is None:
+                            break
+                        depth, url = item
+                        in_flight[pool.submit(self._fetch, url)] = (url, depth)
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url, depth = in_flight[future]
+                        stored = self._handle_result(url, depth, future, max_articles)
+                        # Removed only once handled, so an interrupted store leaves the URL queued
+                        del in_flight[future]
+                        if stored and self.stats.articles_stored % progress_every == 0:
+                            print(self.stats.progress(max_articles))
+
+                    self._apply_written()
+                    if self.checkpoint is not None and time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                        self._save_checkpoint(start_url, in_flight)
+                        last_checkpoint = time.monotonic()
+
+                # Anything still running past the limit is dropped
+                for future in in_flight:
+                    future.cancel()
+        finally:
+            # Unfinished pages are saved as still queued
+            if self.checkpoint is not None:
+                self._save_checkpoint(start_url, in_flight)
+
+        self._apply_written()
+        print(f"Crawl finished: {self.stats.as_dict()}")
+        return self.stats
+
+    def _restore(self, start_url):
+        """Load the saved crawl from start_url, if any. Returns True if one was resumed."""
+        saved = self.checkpoint.load(start_url) if self.checkpoint is not None else None
+        if saved is None or not saved["queued"]:
+            return False
+        for priority, url in saved["queued"]:
+            self.frontier.push(url, priority=priority)
+        self.frontier.seen.update(saved["statuses"])
+        self.url_status = dict(saved["statuses"])
+        self.visited_urls.update(url for url, status in saved["statuses"].items() if status == "stored")
+        self.stats = CrawlStats(resumed_articles=saved["articles_stored"])
+        print(f"Resuming crawl: {saved['articles_stored']} articles stored, {len(saved['queued'])} URLs queued")
+        return True
+
+    def _on_stored(self, url):
+        if self.checkpoint is not None:
+            self.checkpoint.mark_stored(url)
+        self.written.append(url)
+
+    def _apply_written(self):
+        while self.written:
+            url = self.written.popleft()
+            self.pending_writes.pop(url, None)
+            self.url_status[url] = "stored"
+
+    def _save_checkpoint(self, start_url, in_flight):
+        self._apply_written()
+        # Articles not written yet are fetched again on resume
+        queued = (self.frontier.items() + [(depth, url) for url, depth in in_flight.values()]
+                  + [(depth, url) for url, depth in self.pending_writes.items()])
+        self.checkpoint.save(start_url, queued, self.url_status)
+
+    def _handle_result(self, url, depth, future, max_articles):
+        """Store a finished page and queue its links. Returns True if the article was kept."""
+        self.stats.pages_fetched += 1
+        try:
+            article_data, new_links = future.result()
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            self.stats.errors += 1
+            self.url_status[url] = "failed"
+            return False
+
+        if article_data is None:
+            # ThoughtCoScraper.scrape_page reports fetch errors itself and returns (None, set())
+            self.stats.errors += 1
+            self.url_status[url] = "failed"
+            return False
+        if not article_data or len(article_data['content']) <= self.min_content_length:
+            self.url_status[url] = "skipped"
+            return False
+        if self.stats.articles_stored >= max_articles:
+            # Fetched past the limit; left queued for a later run
+            self.frontier.requeue(url, priority=depth)
+            return False
+
+        self.pending_writes[url] = depth
+        self.store_article(article_data, lambda: self._on_stored(url))
+        self.visited_urls.add(url)
+        self.stats.articles_stored += 1
+
+        # Shallower pages are crawled first, which keeps the crawl close to the start page
+        for link in new_links:
+            if link not in self.visited_urls:
+                self.frontier.push(link, priority=depth + 1)
+        return True
@@ -0,0 +1,160 @@
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Pattern for article URLs worth following
+ARTICLE_URL_PATTERN = re.compile(r'https?://www\.thoughtco\.com/.*-\d+$')
+
+# "lxml" queries only the heading, content and anchors with XPath; "bs4-lxml" builds the full
+# BeautifulSoup tree with the lxml builder; "html.parser" is the original pure-Python parse
+PARSERS = ("lxml", "bs4-lxml", "html.parser")
+DEFAULT_PARSER = "lxml" if lxml is not None else "html.parser"
+
+TITLE_XPATH = "(//h1[@class='article-heading type--lion'])[1]"
+CONTENT_XPATH = "(//div[@class='loc article-content'])[1]"
+
+FIXTURES_DIR = "fixtures"
+
+
+def article_links(hrefs, base_url, url_pattern=ARTICLE_URL_PATTERN.pattern):
+    links = set()
+    for href in hrefs:
+        url = urljoin(base_url, href)
+        if re.match(url_pattern, url):
+            links.add(url)
+    return links
+
+
+def extract_lxml(html, base_url, url_pattern=ARTICLE_URL_PATTERN.pattern):
+    root = lxml.html.fromstring(html)
+
+    title = ""
+    title_elements = root.xpath(TITLE_XPATH)
+    if title_elements:
+        title = title_elements[0].text_content().strip()
+
+    content = ""
+    content_elements = root.xpath(CONTENT_XPATH)
+    if content_elements:
+        content_element = content_elements[0]
+        for element in content_element.xpath(".//script|.//style"):
+            # drop_tree keeps the text that follows the element
+            element.drop_tree()
+        content = content_element.text_content().strip()
+
+    return title, content, article_links(root.xpath("//a/@href"), base_url, url_pattern)
+
+
+def extract_soup(html, base_url, builder, url_pattern=ARTICLE_URL_PATTERN.pattern):
+    soup = BeautifulSoup(html, builder)
+
+    title = ""
+    title_element = soup.find('h1', class_='article-heading type--lion')
+    if title_element:
+        title = title_element.get_text().strip()
+
+    content = ""
+    content_element = soup.find('div', class_='loc article-content')
+    if content_element:
+        # Remove script and style elements
+        for element in content_element(['script', 'style']):
+            element.decompose()
+        content = content_element.get_text().strip()
+
+    return title, content, article_links((a['href'] for a in soup.find_all('a', href=True)), base_url,
+                                         url_pattern)
+
+
+def extract_html(html, base_url, parser=DEFAULT_PARSER, url_pattern=ARTICLE_URL_PATTERN.pattern):
+    """
+    Title, content (newlines removed) and the links matching url_pattern of a ThoughtCo page.
+    A module-level function so it can run in a process pool; the pattern is a plain string
+    so it pickles with the arguments.
+    """
+    if parser == "lxml":
+        title, content, links = extract_lxml(html, base_url, url_pattern)
+    elif parser == "bs4-lxml":
+        title, content, links = extract_soup(html, base_url, "lxml", url_pattern)
+    else:
+        title, content, links = extract_soup(html, base_url, "html.parser", url_pattern)
+    return title, content.replace('\n', ' '), links
+
+
+def save_fixtures(urls, directory=FIXTURES_DIR, headers=None):
+    """Download pages to parse offline in benchmark_parsers"""
+    import requests
+    os.makedirs(directory, exist_ok=True)
+    for url in urls:
+        response = requests.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        path = os.path.join(directory, url.rstrip('/').rsplit('/', 1)[-1] + ".html")
+        with open(path, "w", encoding="utf-8") as f:
+            # The page URL is kept in the first line so links resolve the same way
+            f.write(f"<!-- {url} -->\n{response.text}")
+        print(f"Saved {url} to {path}")
+
+
+def load_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    first_line = html.split("\n", 1)[0]
+    base_url = first_line[5:-4] if first_line.startswith("<!-- ") else "https://www.thoughtco.com/"
+    return html, base_url
+
+
+def benchmark_parsers(paths, parsers=None, repeat=5):
+    """Milliseconds per page for each parser, its speedup over html.parser and whether its output matches"""
+    pages = [load_fixture(path) for path in paths]
+    parsers = parsers or [parser for parser in PARSERS if lxml is not None or "lxml" not in parser]
+    if "html.parser" not in parsers:
+        parsers = list(parsers) + ["html.parser"]
+    expected = [extract_html(html, base_url, "html.parser") for html, base_url in pages]
+
+    report = {}
+    for parser in parsers:
+        timings = []
+        for _ in range(repeat):
+            for html, base_url in pages:
+                start = time.perf_counter()
+                extract_html(html, base_url, parser)
+                timings.append((time.perf_counter() - start) * 1000)
+        outputs = [extract_html(html, base_url, parser) for html, base_url in pages]
+        report[parser] = {
+            "mean_ms": round(statistics.mean(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "pages_per_sec": round(1000 / statistics.mean(timings), 1),
+            "matches_html_parser": outputs == expected
+        }
+    for result in report.values():
+        result["speedup"] = round(report["html.parser"]["mean_ms"] / result["mean_ms"], 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare HTML parsers on saved ThoughtCo pages")
+    parser.add_argument("paths", nargs="*", help=f"Fixture pages (default: {FIXTURES_DIR}/*.html)")
+    parser.add_argument("--save", nargs="+", metavar="URL", help="Download pages into the fixtures directory")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.save:
+        save_fixtures(args.save)
+    else:
+        paths = args.paths or sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+        if not paths:
+            parser.error(f"no fixture pages in {FIXTURES_DIR}/; download some first with --save URL [URL ...]")
+        print(f"{len(paths)} pages, {args.repeat} runs each")
+        for name, result in benchmark_parsers(paths, repeat=args.repeat).items():
+            print(f"{name:12} {result['mean_ms']:8.2f} ms/page  {result['pages_per_sec']:8.1f} pages/sec  "
+                  f"{result['speedup']:5.2f}x  matches html.parser: {result['matches_html_parser']}")
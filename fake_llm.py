@@ -0,0 +1,72 @@
+import asyncio
+import os
+import time
+
+from llm import build_messages
+from metrics import GenerationRecorder
+
+DEFAULT_ANSWER = (
+    "This is a placeholder answer from the offline stand-in model. It streams a fixed "
+    "number of tokens with a configurable delay so the servers can be load tested "
+    "without calling the Hugging Face API."
+)
+
+
+class FakeAsyncLLM:
+    """
+    Drop-in replacement for AsyncHuggingFaceHelper that never leaves the process.
+
+    Args:
+        time_to_first_token: Seconds before the first token
+        tokens_per_sec: Rate of the following tokens
+        answer: Text to stream, split on spaces
+    """
+
+    def __init__(self, time_to_first_token=None, tokens_per_sec=None, answer=DEFAULT_ANSWER):
+        self.time_to_first_token = float(time_to_first_token if time_to_first_token is not None
+                                         else os.getenv("FAKE_LLM_TTFT", "0.3"))
+        self.tokens_per_sec = float(tokens_per_sec if tokens_per_sec is not None
+                                    else os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50"))
+        self.tokens = [word + " " for word in answer.split(" ")]
+
+    async def stream_response(self, question: str, context: str, system_prompt: str,
+                              history=None, summary=None):
+        # Recorded like the real client so load tests fill in the LLM metrics
+        recorder = GenerationRecorder(build_messages(question, context, system_prompt, history, summary))
+        try:
+            await asyncio.sleep(self.time_to_first_token)
+            delay = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+            for index, token in enumerate(self.tokens):
+                if index:
+                    await asyncio.sleep(delay)
+                recorder.token()
+                yield token
+        finally:
+            recorder.finish()
+
+    async def generate_response(self, question: str, context: str, system_prompt: str,
+                                history=None, summary=None) -> str:
+        return "".join([token async for token in self.stream_response(question, context, system_prompt,
+                                                                       history=history, summary=summary)])
+
+
+class FakeLLM(FakeAsyncLLM):
+    """Blocking version of FakeAsyncLLM, a drop-in replacement for HuggingFaceHelper"""
+
+    def stream_response(self, question: str, context: str, system_prompt: str,
+                        history=None, summary=None):
+        recorder = GenerationRecorder(build_messages(question, context, system_prompt, history, summary))
+        try:
+            time.sleep(self.time_to_first_token)
+            delay = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+            for index, token in enumerate(self.tokens):
+                if index:
+                    time.sleep(delay)
+                recorder.token()
+                yield token
+        finally:
+            recorder.finish()
+
+    def generate_response(self, question: str, context: str, system_prompt: str,
+                          history=None, summary=None) -> str:
+        return "".join(self.stream_response(question, context, system_prompt, history=history, summary=summary))
@@ -1,220 +1,225 @@
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-import streamlit as st
-import chromadb
-from chromadb.utils import embedding_functions
-import numpy as np
-from sentence_transformers import CrossEncoder
-from huggingface_hub import InferenceClient
 import os
-from typing import List, Tuple
-from datetime import datetime, timedelta
-
-from flask import Flask, request, jsonify
+# Chroma needs a newer sqlite3 than some hosts ship; the artifact bundle doesn't use Chroma
+if not os.getenv("ARTIFACT_BUNDLE"):
+    __import__('pysqlite3')
+    import sys
+    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import json
+import time
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 
-# Initialize local memory for conversation history
-user_sessions = {}
-
-""" from load_dotenv import load_dotenv
-
-load_dotenv() """
-
-system_prompt = """
-SYSTEM PROMPT:
-You are an AI assistant for Thought Co tasked with providing answers based on the given context. Your goal is to analyze the information provided and formulate a response with a reading ease of flesch reading score of 80, concise and well-structured response to the question. Sometimes the information might not be sufficient to answer the question fully, in which case you should state this clearly in your response.
-
-context will be passed as "Context:"
-user question will be passed as "Question:"
-
-To answer the question:
-1. Thoroughly analyze the context, identifying key information relevant to the question.
-2. Organize your thoughts and plan your response to ensure a logical flow of information.
-3. Formulate a detailed answer that directly addresses the question, using only the information provided in the context.
-4. Ensure your answer is comprehensive, covering all relevant aspects found in the context.
-5. If the context doesn't contain sufficient information to fully answer the question, state this clearly in your response.
-
-Format your response as follows:
-1. Use clear, concise language.
-2. Organize your answer into paragraphs for readability.
-3. Use bullet points or numbered lists where appropriate to break down complex information.
-4. If relevant, include any headings or subheadings to structure your response.
-5. Ensure proper grammar, punctuation, and spelling throughout your answer.
-
-IMPORTANT: At the beginning, write a short sentence summarizing your answer and then go into detail about it. You don't need to use the sources but it is appreciated.
-DO NOT PROVIDE MORE UNRELATED INFORMATION THAN NECESSARY.
-"""
-
-# read articles.txt to get article titles
-article_titles = [article for article in open("articles.txt").read().split("\n") if article]
-
-class VectorDBQuery:
-    def __init__(self, db_path="./vector_db_new"):
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        self.collection = self.chroma_client.get_collection(
-            name="thoughtco_articles",
-            embedding_function=self.embedding_function
-        )
-
-    def search_similar(self, query_text: str, n_results: int = 10, n_rerank: int = 3) -> List[Tuple]:
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
-
-        if results['distances'][0]:
-            max_distance = max(results['distances'][0])
-            similarities = [100 * (1 - (dist / max_distance)) for dist in results['distances'][0]]
-            print(similarities)
-        else:
-            similarities = []
-        
-        documents = results['documents'][0]
-        metadatas = results['metadatas'][0]
-        
-        pairs = [[query_text, doc] for doc in documents]
-        cross_scores = self.cross_encoder.predict(pairs)
-        
-        ranked_results = list(zip(cross_scores, metadatas, documents, similarities))
-        ranked_results.sort(reverse=True)
-        
-        top_results = ranked_results[:n_rerank]
-        
-        return [(metadata, document, similarities) 
-                for score, metadata, document, similarities in top_results]
-
-class HuggingFaceHelper:
-    def __init__(self):
-        self.client = InferenceClient(api_key=os.getenv("HUGGINGFACE_API_KEY"))
-        self.model = "meta-llama/Meta-Llama-3-8B-Instruct"
-
-    def generate_response(self, question: str, context: str, system_prompt: str) -> str:
-        messages = [
-            {
-                "role": "assistant",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": f"Context: {context}\n\nQuestion: {question}"
-            }
-        ]
-        
-        try:
-            response_text = ""
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=600,
-                temperature=0.7,
-                stream=True
-            )
-            
-            # Create a placeholder for streaming response
-            response_placeholder = st.empty()
-
-            response_placeholder.markdown("🤖 Answer: ")
-            
-            # Stream the response
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    response_text += chunk.choices[0].delta.content
-                    response_placeholder.markdown(response_text + "▌")
-            
-            response_placeholder.markdown(response_text)
-
-            # once finished generating remove the placeholder
-            response_placeholder.empty()
-
-            return response_text
-            
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
-
-def format_documents(results: List[Tuple]) -> str:
-    context = ""
-    for metadata, document, similarity in results:
-        context += f"\nTitle: {metadata['title']}\n"
-        context += f"Content: {document}\n"
-        context += f"Source: {metadata['url']}\n\n"
-    return context
+from chat_service import (
+    RETRIEVAL_MODE, HYBRID_RETRIEVAL, VECTOR_BACKEND, system_prompt, start_turn, finish_turn,
+    get_conversation, prompt_history, format_sources, sse_event, read_batch_request,
+    read_search_request, search_page, suggest_titles
+)
+from llm import HuggingFaceHelper
+from metrics import metrics, start_trace, finish_trace, server_timing, record_startup, startup_seconds
+from model_registry import get_registry
+from retrieval import VectorDBQuery, format_documents
 
 app = Flask(__name__)
-CORS(app)
-
-def cleanup_sessions():
-    """Remove sessions older than 1 hour."""
-    current_time = datetime.now()
-    expired_sessions = [
-        session_id for session_id, session_data in user_sessions.items()
-        if session_data['last_active'] < current_time - timedelta(hours=1)
-    ]
-    for session_id in expired_sessions:
-        del user_sessions[session_id]
+# Let browser clients read the tracing headers
+CORS(app, expose_headers=["X-Trace-Id", "Server-Timing"])
+
+# Optionally load the models when the worker starts instead of on the first chat
+if os.getenv("WARM_UP_MODELS", "").lower() in ("1", "true", "yes"):
+    get_registry().warm_up(background=True)
+
+@app.before_request
+def begin_trace():
+    # Reuse the caller's trace id so a request can be followed across services
+    g.trace, g.trace_token = start_trace(request.headers.get("X-Trace-Id"))
+
+@app.after_request
+def add_trace_headers(response):
+    trace, token = g.trace, g.trace_token
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    response.headers["X-Trace-Id"] = trace["id"]
+    response.headers["Server-Timing"] = server_timing(trace)
+
+    def finish():
+        # The first request of a process includes loading the models and index
+        record_startup("first_request", time.perf_counter() - trace["start"])
+        finish_trace(trace, token, endpoint, response.status_code)
+
+    # Streamed responses are only finished once the body has been sent
+    response.call_on_close(finish)
+    return response
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    global user_sessions, system_prompt
-
     data = request.get_json()
     user_question = data.get('question')
     session_id = data.get('session_id')
+    # Number of messages the client already has; only newer ones are returned
+    since = data.get('since')
 
     if not user_question:
         return jsonify({"error": "Question is required."}), 400
+    if since is not None and not isinstance(since, int):
+        return jsonify({"error": "since must be an integer."}), 400
 
-    if not session_id:
-        # Generate a new session ID if one is not provided
-        session_id = str(uuid.uuid4())
-        user_sessions[session_id] = {
-            "history": [],
-            "last_active": datetime.now()
-        }
-
-    # Cleanup old sessions
-    cleanup_sessions()
-
-    # Update session history and timestamp
-    user_sessions[session_id]["history"].append({"role": "user", "content": user_question})
-    user_sessions[session_id]["last_active"] = datetime.now()
+    session_id = start_turn(session_id, user_question)
+    history, summary = prompt_history(session_id)
 
     # Search for relevant documents
-    db_query = VectorDBQuery()
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
     results = db_query.search_similar(user_question, n_results=10, n_rerank=3)
-    context = format_documents(results)
+    context = format_documents(db_query.compress_context(user_question, results))
 
     # Generate response from LLM
     llm_helper = HuggingFaceHelper()
     llm_response = llm_helper.generate_response(
         question=user_question,
         context=context,
-        system_prompt=system_prompt
+        system_prompt=system_prompt,
+        history=history,
+        summary=summary
     )
 
     # Add assistant response to conversation history
-    user_sessions[session_id]["history"].append({"role": "assistant", "content": llm_response})
+    finish_turn(session_id, llm_response)
 
     # Return response with conversation history
     return jsonify({
         "session_id": session_id,
-        "conversation": user_sessions[session_id]["history"],
-        "sources": [{
-            "title": metadata['title'],
-            "url": metadata['url'],
-            "similarity": similarity
-        } for metadata, document, similarity in results]
+        **get_conversation(session_id, since),
+        "sources": format_sources(results)
     })
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Same input as /api/chat, answered as server-sent events: a "sources" event,
+    then one "token" event per LLM token, then "done" (or "error").
+    """
+    request_start = time.perf_counter()
+
+    data = request.get_json()
+    user_question = data.get('question')
+    session_id = data.get('session_id')
+
+    if not user_question:
+        return jsonify({"error": "Question is required."}), 400
+
+    session_id = start_turn(session_id, user_question)
+    history, summary = prompt_history(session_id)
+
+    # Search for relevant documents
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    results = db_query.search_similar(user_question, n_results=10, n_rerank=3)
+    context = format_documents(db_query.compress_context(user_question, results))
+    prompt = system_prompt
+
+    def generate():
+        yield sse_event("sources", {"session_id": session_id, "sources": format_sources(results)})
+
+        tokens = []
+        time_to_first_token = None
+        completed = False
+        token_stream = HuggingFaceHelper().stream_response(
+            question=user_question,
+            context=context,
+            system_prompt=prompt,
+            history=history,
+            summary=summary
+        )
+        try:
+            for token in token_stream:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - request_start
+                tokens.append(token)
+                yield sse_event("token", {"token": token})
+            completed = True
+        except Exception as e:
+            yield sse_event("error", {"error": f"Error generating response: {str(e)}"})
+        finally:
+            # Also runs when the client disconnects: stop the upstream LLM stream
+            token_stream.close()
+            if tokens:
+                finish_turn(session_id, "".join(tokens))
+
+        if completed:
+            yield sse_event("done", {
+                "time_to_first_token": time_to_first_token,
+                "total_time": time.perf_counter() - request_start,
+                "tokens": len(tokens)
+            })
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Stop reverse proxies from buffering the stream
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/search', methods=['GET', 'POST'])
+def search_articles():
+    """
+    Related articles without calling the LLM. Options in the query string or a JSON body: q,
+    n_results (candidates to rank), page_size (or n_rerank), rerank=false to keep the vector
+    order, fields (default title,url,similarity; add document for the text) and cursor, the
+    next_cursor of the previous page.
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    try:
+        options = read_search_request(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    start = time.perf_counter()
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    # Every candidate is ranked, then the requested page is cut out
+    results = db_query.search_similar(options["query"], n_results=options["n_results"],
+                                      n_rerank=options["n_results"], rerank=options["rerank"])
+    return jsonify({**search_page(results, options), "took_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Related articles for many queries without calling the LLM: {"queries": [...], "n_results": 10,
+    "n_rerank": 3} returns one list of sources per query, in order.
+    """
+    try:
+        queries, n_results, n_rerank = read_batch_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    start = time.perf_counter()
+    db_query = VectorDBQuery(mode=RETRIEVAL_MODE, hybrid=HYBRID_RETRIEVAL, backend=VECTOR_BACKEND)
+    results = db_query.search_batch(queries, n_results=n_results, n_rerank=n_rerank)
+    elapsed = time.perf_counter() - start
+    return jsonify({
+        "results": [{"query": query, "sources": format_sources(query_results)}
+                    for query, query_results in zip(queries, results)],
+        "queries_per_sec": round(len(queries) / elapsed, 2) if elapsed else None
+    })
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Article titles matching what has been typed so far: ?q=...&limit=8 (at most 20)."""
+    try:
+        return jsonify(suggest_titles(get_registry().get_suggest_index(), request.args.to_dict()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 # add hello world route
 @app.route('/api/hello', methods=['GET'])
 def hello():
     return jsonify({"message": "Hello, World!"})
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Report whether the shared models have finished loading."""
+    status = {**get_registry().status(), "startup": startup_seconds}
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage latencies, LLM timings, prompt sizes, cache and session counts in Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 app = app.wsgi_app
 
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# "torch" is the stock model. "torch-int8" applies dynamic int8 quantization to the Linear
+# layers at load time. "onnx" and "onnx-int8" run the models exported by `python
+# inference_backend.py export` on onnxruntime (needs optimum[onnxruntime]).
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+ONNX_MODELS_DIR = "./onnx_models"
+
+# Instruction set the int8 ONNX export is tuned for; avx2 runs on practically any x86 server
+ONNX_QUANTIZATION_CONFIG = "avx2"
+
+# Default questions for the parity check
+PARITY_QUERIES = [
+    "What is the difference between weather and climate?",
+    "How does photosynthesis work?",
+    "Who was the first emperor of Rome?",
+    "What causes the seasons on Earth?",
+    "How do you calculate the area of a circle?",
+    "What is a metaphor?",
+    "Why did the Roman Empire fall?",
+    "What is the function of the mitochondria?",
+]
+
+
+def configure_threads(threads=None):
+    """Set the intra-op thread count for torch; returns the count the ONNX sessions should use"""
+    threads = int(threads or os.getenv("INFERENCE_THREADS", "0")) or None
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return threads
+
+
+def export_path(model_name, models_dir=ONNX_MODELS_DIR):
+    return os.path.join(models_dir, model_name.replace("/", "--"))
+
+
+def onnx_file_name(backend):
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+    return "onnx/model.onnx"
+
+
+def onnx_model_kwargs(backend, threads):
+    model_kwargs = {"file_name": onnx_file_name(backend), "provider": "CPUExecutionProvider"}
+    if threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        model_kwargs["session_options"] = session_options
+    return model_kwargs
+
+
+def resolve_backend(model_name, backend, models_dir=ONNX_MODELS_DIR):
+    """The backend that can actually be used: ONNX backends fall back to torch when the export is missing"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    if backend.startswith("onnx"):
+        path = os.path.join(export_path(model_name, models_dir), onnx_file_name(backend))
+        if not os.path.exists(path):
+            print(f"No ONNX export at {path}, running {model_name} on torch")
+            return "torch"
+    return backend
+
+
+def quantize_linear_layers(module):
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_sentence_transformer(model_name, backend="torch", threads=None, models_dir=ONNX_MODELS_DIR):
+    from sentence_transformers import SentenceTransformer
+    threads = configure_threads(threads)
+    backend = resolve_backend(model_name, backend, models_dir)
+    if backend.startswith("onnx"):
+        try:
+            return SentenceTransformer(export_path(model_name, models_dir), backend="onnx",
+                                       model_kwargs=onnx_model_kwargs(backend, threads))
+        except (ImportError, TypeError) as e:
+            print(f"Can't run {model_name} on onnxruntime ({e}), running it on torch")
+            backend = "torch"
+    model = SentenceTransformer(model_name, device="cpu")
+    return quantize_linear_layers(model) if backend == "torch-int8" else model
+
+
+def load_cross_encoder(model_name, backend="torch", threads=None, models_dir=ONNX_MODELS_DIR):
+    from sentence_transformers import CrossEncoder
+    threads = configure_threads(threads)
+    backend = resolve_backend(model_name, backend, models_dir)
+    if backend.startswith("onnx"):
+        try:
+            return CrossEncoder(export_path(model_name, models_dir), backend="onnx",
+                                model_kwargs=onnx_model_kwargs(backend, threads))
+        except (ImportError, TypeError) as e:
+            # CrossEncoder only takes a backend from sentence-transformers 4.1
+            print(f"Can't run {model_name} on onnxruntime ({e}), running it on torch")
+            backend = "torch"
+    model = CrossEncoder(model_name, device="cpu")
+    if backend == "torch-int8":
+        model.model = quantize_linear_layers(model.model)
+    return model
+
+
+def make_embedding_function(model):
+    """Wrap a SentenceTransformer as a Chroma embedding function"""
+    from chromadb.api.types import EmbeddingFunction
+
+    class SentenceTransformerModelFunction(EmbeddingFunction):
+        def __call__(self, input):
+            return [embedding.tolist() for embedding in model.encode(list(input), convert_to_numpy=True)]
+
+    return SentenceTransformerModelFunction()
+
+
+def export_models(model_names, models_dir=ONNX_MODELS_DIR):
+    """Export models to ONNX, plus a dynamically quantized int8 copy of each"""
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    for model_class, model_name in model_names:
+        path = export_path(model_name, models_dir)
+        model = model_class(model_name, backend="onnx")
+        model.save_pretrained(path)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION_CONFIG, path)
+        print(f"Exported {model_name} to {path}")
+
+
+def top_k_overlap(reference, candidate, k):
+    reference_top = set(np.argsort(-np.asarray(reference))[:k])
+    candidate_top = set(np.argsort(-np.asarray(candidate))[:k])
+    return len(reference_top & candidate_top) / max(len(reference_top), 1)
+
+
+def parity_check(backend, queries, documents, embedding_model_name, cross_encoder_model_name,
+                 k=3, models_dir=ONNX_MODELS_DIR):
+    """
+    Compare a backend against torch on the same queries and documents. Reports embedding cosine
+    similarity, top-k overlap of the dense and cross-encoder rankings, and time per query.
+    """
+    report = {"backend": backend}
+    reference_embedder = load_sentence_transformer(embedding_model_name, "torch", models_dir=models_dir)
+    embedder = load_sentence_transformer(embedding_model_name, backend, models_dir=models_dir)
+
+    timings = {}
+    embeddings = {}
+    for name, model in (("torch", reference_embedder), (backend, embedder)):
+        start = time.perf_counter()
+        query_embeddings = model.encode(queries, convert_to_numpy=True)
+        timings[name] = 1000 * (time.perf_counter() - start) / len(queries)
+        embeddings[name] = (query_embeddings, model.encode(documents, convert_to_numpy=True))
+
+    (reference_queries, reference_docs), (candidate_queries, candidate_docs) = embeddings["torch"], embeddings[backend]
+    cosines = np.sum(reference_queries * candidate_queries, axis=1) / (
+        np.linalg.norm(reference_queries, axis=1) * np.linalg.norm(candidate_queries, axis=1))
+    report["embedding_min_cosine"] = float(cosines.min())
+    report["dense_top_k_overlap"] = float(np.mean([
+        top_k_overlap(reference_docs @ reference_query, candidate_docs @ candidate_query, k)
+        for reference_query, candidate_query in zip(reference_queries, candidate_queries)
+    ]))
+    report["embed_ms_per_query"] = {name: round(ms, 2) for name, ms in timings.items()}
+
+    reference_encoder = load_cross_encoder(cross_encoder_model_name, "torch", models_dir=models_dir)
+    cross_encoder = load_cross_encoder(cross_encoder_model_name, backend, models_dir=models_dir)
+    overlaps = []
+    max_score_diff = 0.0
+    timings = {"torch": 0.0, backend: 0.0}
+    for query in queries:
+        pairs = [[query, document] for document in documents]
+        scores = {}
+        for name, model in (("torch", reference_encoder), (backend, cross_encoder)):
+            start = time.perf_counter()
+            scores[name] = np.asarray(model.predict(pairs), dtype=np.float32)
+            timings[name] += time.perf_counter() - start
+        overlaps.append(top_k_overlap(scores["torch"], scores[backend], k))
+        max_score_diff = max(max_score_diff, float(np.abs(scores["torch"] - scores[backend]).max()))
+    report["rerank_top_k_overlap"] = float(np.mean(overlaps))
+    report["rerank_max_score_diff"] = max_score_diff
+    report["rerank_ms_per_query"] = {name: round(1000 * seconds / len(queries), 2)
+                                     for name, seconds in timings.items()}
+    return report
+
+
+if __name__ == "__main__":
+    from model_registry import CROSS_ENCODER_MODEL_NAME, EMBEDDING_MODEL_NAME, get_registry
+
+    parser = argparse.ArgumentParser(description="Export the models to ONNX and check ranking parity with torch")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the embedder and cross encoder to ONNX")
+    export_parser.add_argument("--models-dir", default=ONNX_MODELS_DIR)
+    parity_parser = subparsers.add_parser("parity", help="Compare a backend's rankings with torch")
+    parity_parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx")
+    parity_parser.add_argument("--models-dir", default=ONNX_MODELS_DIR)
+    parity_parser.add_argument("--db-path", default="./vector_db_new")
+    parity_parser.add_argument("--queries", help="File with one query per line")
+    parity_parser.add_argument("--documents", type=int, default=30, help="Documents ranked per query")
+    parity_parser.add_argument("-k", type=int, default=3)
+    parity_parser.add_argument("--min-overlap", type=float, default=0.9,
+                               help="Fail when the average top-k overlap is below this")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from sentence_transformers import CrossEncoder, SentenceTransformer
+        export_models([(SentenceTransformer, EMBEDDING_MODEL_NAME), (CrossEncoder, CROSS_ENCODER_MODEL_NAME)],
+                      args.models_dir)
+    else:
+        queries = PARITY_QUERIES
+        if args.queries:
+            with open(args.queries) as f:
+                queries = [line.strip() for line in f if line.strip()]
+        documents = get_registry(args.db_path).get_collection().get(limit=args.documents)['documents']
+        report = parity_check(args.backend, queries, documents, EMBEDDING_MODEL_NAME, CROSS_ENCODER_MODEL_NAME,
+                              args.k, args.models_dir)
+        print(json.dumps(report, indent=2))
+        passed = min(report["dense_top_k_overlap"], report["rerank_top_k_overlap"]) >= args.min_overlap
+        print("Rankings match" if passed else f"Rankings differ: top-{args.k} overlap below {args.min_overlap}")
+        sys.exit(0 if passed else 1)
@@ -0,0 +1,231 @@
+import queue
+import threading
+import time
+
+# Marks the end of the input so each stage can flush and exit
+_STOP = object()
+
+
+class StageStats:
+    """Item count and busy time for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy_time = 0.0
+        self.errors = 0
+
+    def record(self, items, seconds):
+        self.items += items
+        self.batches += 1
+        self.busy_time += seconds
+
+    def as_dict(self, wall_time):
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "errors": self.errors,
+            "busy_sec": round(self.busy_time, 3),
+            # Throughput while the stage was working, and over the whole run
+            "docs_per_sec_busy": round(self.items / self.busy_time, 2) if self.busy_time else 0.0,
+            "docs_per_sec_wall": round(self.items / wall_time, 2) if wall_time else 0.0
+        }
+
+
+class _PendingArticle:
+    """Counts the written records of one submitted article and calls on_stored once all are written"""
+
+    def __init__(self, records, on_stored):
+        self.remaining = records
+        self.on_stored = on_stored
+        self.failed = False
+        # Failed embeddings are reported from the embedding thread, writes from the writer
+        self.lock = threading.Lock()
+
+    def done(self, ok):
+        with self.lock:
+            self.failed = self.failed or not ok
+            self.remaining -= 1
+            finished = self.remaining == 0 and not self.failed
+        if finished:
+            self.on_stored()
+
+
+class IngestionPipeline:
+    """
+    Embed and write articles in batches on background threads.
+
+    Articles submitted with `submit` are turned into documents (one per article, or one per
+    passage when a `chunker` is given) that go into a bounded queue. An embedding thread groups them
+    into batches of `batch_size` (or whatever has arrived after `flush_interval` seconds) and
+    embeds each batch in one forward pass. A writer thread stores each batch with a single
+    `collection.upsert`. Fetching, embedding and writing therefore overlap, and a full queue
+    slows the crawler down instead of growing memory. An `on_stored` callback passed to `submit`
+    runs on the writer thread once every document of that article has been written.
+
+    Args:
+        collection: Chroma collection to write to
+        embedding_function: Callable mapping a list of texts to a list of vectors
+        id_fn: Callable mapping article_data to the document id
+        chunker: Optional callable (article_data, parent_id) -> [(id, document, metadata)]
+        batch_size: Maximum documents per embedding call and upsert
+        queue_size: Maximum documents waiting to be embedded
+        flush_interval: Seconds to wait for a batch to fill before embedding a partial one
+    """
+
+    def __init__(self, collection, embedding_function, id_fn, chunker=None, batch_size=32,
+                 queue_size=256, flush_interval=2.0):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.id_fn = id_fn
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.input_queue = queue.Queue(maxsize=queue_size)
+        # A couple of embedded batches may wait for the writer while the next one is embedded
+        self.write_queue = queue.Queue(maxsize=2)
+
+        self.submit_stats = StageStats("submit")
+        self.embed_stats = StageStats("embed")
+        self.write_stats = StageStats("write")
+
+        self.threads = []
+        self.start_time = None
+        self.closed = False
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.threads = [
+            threading.Thread(target=self._embed_loop, name="ingest-embed", daemon=True),
+            threading.Thread(target=self._write_loop, name="ingest-write", daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def to_records(self, article_data):
+        """Split an article into the (id, document, metadata) records that get embedded"""
+        doc_id = self.id_fn(article_data)
+        if self.chunker is not None:
+            return self.chunker(article_data, doc_id)
+        return [(doc_id, article_data['content'], {
+            'title': article_data['title'],
+            'url': article_data['url']
+        })]
+
+    def submit(self, article_data, on_stored=None):
+        """
+        Queue an article for embedding; blocks while the queue is full. on_stored is called
+        without arguments after all its documents are written, and never if any of them fail.
+        """
+        if self.closed:
+            raise RuntimeError("Pipeline is closed")
+        records = self.to_records(article_data)
+        if not records:
+            if on_stored is not None:
+                on_stored()
+            return
+        pending = _PendingArticle(len(records), on_stored) if on_stored is not None else None
+        start = time.perf_counter()
+        for record in records:
+            self.input_queue.put((record, pending))
+        self.submit_stats.record(len(records), time.perf_counter() - start)
+
+    def close(self):
+        """Flush everything still queued, wait for the writer and print throughput"""
+        if self.closed:
+            return self.report()
+        self.closed = True
+        self.input_queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        report = self.report()
+        print(f"Ingestion finished: {report}")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def report(self):
+        wall_time = time.perf_counter() - self.start_time if self.start_time else 0.0
+        return {
+            "wall_sec": round(wall_time, 3),
+            "stages": {
+                stats.name: stats.as_dict(wall_time)
+                for stats in (self.submit_stats, self.embed_stats, self.write_stats)
+            }
+        }
+
+    def _next_batch(self):
+        """Collect up to batch_size records. Returns (batch, stop_seen)."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.input_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch, False
+
+    def _embed_loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                embeddings = self.embedding_function([document for (_, document, _), _ in batch])
+            except Exception as e:
+                print(f"Error embedding batch of {len(batch)} documents: {str(e)}")
+                self.embed_stats.errors += 1
+                self._finish(batch, ok=False)
+                continue
+            self.embed_stats.record(len(batch), time.perf_counter() - start)
+
+            self.write_queue.put((batch, embeddings))
+
+        self.write_queue.put(_STOP)
+
+    def _write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is _STOP:
+                return
+            batch, embeddings = item
+
+            start = time.perf_counter()
+            try:
+                self.collection.upsert(
+                    ids=[doc_id for (doc_id, _, _), _ in batch],
+                    documents=[document for (_, document, _), _ in batch],
+                    embeddings=[list(map(float, embedding)) for embedding in embeddings],
+                    metadatas=[metadata for (_, _, metadata), _ in batch]
+                )
+            except Exception as e:
+                print(f"Error storing batch of {len(batch)} documents in vector DB: {str(e)}")
+                self.write_stats.errors += 1
+                self._finish(batch, ok=False)
+                continue
+            self.write_stats.record(len(batch), time.perf_counter() - start)
+            self._finish(batch, ok=True)
+
+    def _finish(self, batch, ok):
+        for _, pending in batch:
+            if pending is not None:
+                try:
+                    pending.done(ok)
+                except Exception as e:
+                    print(f"Error recording stored article: {str(e)}")
@@ -0,0 +1,107 @@
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from metrics import GenerationRecorder
+from model_registry import get_registry
+
+MODEL_NAME = "meta-llama/Meta-Llama-3-8B-Instruct"
+MAX_TOKENS = 600
+TEMPERATURE = 0.7
+
+
+def build_messages(question: str, context: str, system_prompt: str,
+                   history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> List[Dict]:
+    """
+    Prompt messages: the system prompt (plus a summary of older turns), the recent
+    turns of the conversation, then the retrieved context and the new question.
+    """
+    if summary:
+        system_prompt = f"{system_prompt}\nSummary of the earlier conversation:\n{summary}\n"
+    messages = [
+        {
+            "role": "assistant",
+            "content": system_prompt
+        }
+    ]
+    messages.extend({"role": turn["role"], "content": turn["content"]} for turn in history or [])
+    messages.append({
+        "role": "user",
+        "content": f"Context: {context}\n\nQuestion: {question}"
+    })
+    return messages
+
+
+class HuggingFaceHelper:
+    def __init__(self):
+        self.client = get_registry().get_inference_client()
+        self.model = MODEL_NAME
+
+    def stream_response(self, question: str, context: str, system_prompt: str,
+                        history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> Iterator[str]:
+        """Yield response tokens as they arrive; closing the generator closes the upstream stream"""
+        messages = build_messages(question, context, system_prompt, history, summary)
+        recorder = GenerationRecorder(messages)
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    recorder.token()
+                    yield chunk.choices[0].delta.content
+        finally:
+            recorder.finish()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    def generate_response(self, question: str, context: str, system_prompt: str,
+                          history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> str:
+        try:
+            # Collect the tokens and join once instead of concatenating per token
+            return "".join(self.stream_response(question, context, system_prompt, history, summary))
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+
+class AsyncHuggingFaceHelper:
+    """HuggingFaceHelper for the async server; awaits the client instead of blocking a thread"""
+
+    def __init__(self):
+        self.client = get_registry().get_async_inference_client()
+        self.model = MODEL_NAME
+
+    async def stream_response(self, question: str, context: str, system_prompt: str,
+                              history: Optional[List[Dict]] = None,
+                              summary: Optional[str] = None) -> AsyncIterator[str]:
+        messages = build_messages(question, context, system_prompt, history, summary)
+        recorder = GenerationRecorder(messages)
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=MAX_TOKENS,
+            temperature=TEMPERATURE,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    recorder.token()
+                    yield chunk.choices[0].delta.content
+        finally:
+            recorder.finish()
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def generate_response(self, question: str, context: str, system_prompt: str,
+                                history: Optional[List[Dict]] = None, summary: Optional[str] = None) -> str:
+        try:
+            return "".join([token async for token in self.stream_response(
+                question, context, system_prompt, history, summary
+            )])
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
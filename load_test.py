@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "What was the Delian League?",
+    "What does Wernicke's area do?",
+    "What is a spectator ion?",
+    "How do you streak a bacterial culture?",
+    "What are the genetic effects of inbreeding?",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def one_chat(client, url, question):
+    start = time.perf_counter()
+    response = await client.post(url, json={"question": question})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(base_url, concurrency, total, endpoint):
+    """Send `total` chats with at most `concurrency` in flight and summarize latency"""
+    url = f"{base_url}{endpoint}"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def worker(index):
+        nonlocal errors
+        async with semaphore:
+            try:
+                latencies.append(await one_chat(client, url, QUESTIONS[index % len(QUESTIONS)]))
+            except Exception as e:
+                errors += 1
+                print(f"Request {index} failed: {str(e)}")
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_sec": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_mean": statistics.mean(latencies) if latencies else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fire concurrent chats at a running API server")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--endpoint", default="/api/chat")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.base_url, args.concurrency, args.requests, args.endpoint)), indent=2))
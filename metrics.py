@@ -0,0 +1,238 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from conversation import estimate_tokens
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+PROMPT_CHAR_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+PROMPT_TOKEN_BUCKETS = (125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# Requests slower than this print their per-stage breakdown
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines.extend(f"{self.name}{format_labels(key)} {value}" for key, value in sorted(self.values.items()))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        # labels -> [count per bucket (last is +Inf), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self.lock:
+            counts, _ = entry = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            counts[index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from a function when the metrics are rendered; the function returns {labels tuple: value}"""
+
+    def __init__(self, name, help_text, read, metric_type="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.metric_type = metric_type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {str(e)}")
+            values = {}
+        lines.extend(f"{self.name}{format_labels(key)} {value}" for key, value in sorted(values.items()))
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics.setdefault(metric.name, metric)
+        return self.metrics[metric.name]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.register(Histogram(
+    "thoughtco_stage_seconds", "Time spent in each stage of a request", label_names=("stage",)))
+requests_total = metrics.register(Counter(
+    "thoughtco_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status")))
+request_seconds = metrics.register(Histogram(
+    "thoughtco_request_seconds", "HTTP request duration", label_names=("endpoint",)))
+time_to_first_token = metrics.register(Histogram(
+    "thoughtco_llm_time_to_first_token_seconds", "Time from sending the prompt to the first LLM token"))
+tokens_per_second = metrics.register(Histogram(
+    "thoughtco_llm_tokens_per_second", "LLM generation rate after the first token", RATE_BUCKETS))
+generated_tokens = metrics.register(Counter(
+    "thoughtco_llm_tokens_total", "Tokens streamed from the LLM"))
+prompt_chars = metrics.register(Histogram(
+    "thoughtco_prompt_chars", "Prompt size in characters", PROMPT_CHAR_BUCKETS))
+prompt_tokens = metrics.register(Histogram(
+    "thoughtco_prompt_tokens", "Estimated prompt size in tokens", PROMPT_TOKEN_BUCKETS))
+
+
+def read_cache_counters():
+    from model_registry import get_registry
+    status = get_registry().status()
+    values = {}
+    if "query_cache" in status:
+        for name in ("memory_hits", "disk_hits", "misses"):
+            values[(("cache", "query_embedding"), ("result", name))] = status["query_cache"][name]
+    if "reranker" in status:
+        values[(("cache", "rerank_score"), ("result", "hits"))] = status["reranker"]["cache_hits"]
+        values[(("cache", "rerank_score"), ("result", "misses"))] = status["reranker"]["pairs"]
+    return values
+
+
+metrics.register(Gauge("thoughtco_cache_lookups_total", "Query embedding and rerank score cache lookups",
+                       read_cache_counters, "counter"))
+
+# Cold start phases in seconds: "import" (entry point importable) and "first_request"
+startup_seconds = {}
+
+metrics.register(Gauge("thoughtco_startup_seconds", "Import time and first request duration of this process",
+                       lambda: {(("phase", phase),): seconds for phase, seconds in startup_seconds.items()}))
+
+
+def record_startup(phase, seconds):
+    """Record a cold start phase; only the first measurement of each phase is kept"""
+    if phase not in startup_seconds:
+        startup_seconds[phase] = seconds
+        print(f"Cold start: {phase} took {seconds * 1000:.0f}ms")
+
+
+# The trace of the request being handled, a dict with its id and per-stage seconds
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def start_trace(trace_id=None):
+    """Start tracing a request; returns (trace, token to pass to finish_trace)"""
+    trace = {"id": trace_id or uuid.uuid4().hex, "start": time.perf_counter(), "stages": {}}
+    return trace, current_trace.set(trace)
+
+
+def finish_trace(trace, token, endpoint, status):
+    elapsed = time.perf_counter() - trace["start"]
+    requests_total.inc(endpoint=endpoint, status=status)
+    request_seconds.observe(elapsed, endpoint=endpoint)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        stages = " ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in trace["stages"].items())
+        print(f"Slow request {trace['id']} {endpoint} {status}: {elapsed * 1000:.0f}ms {stages}")
+    try:
+        current_trace.reset(token)
+    except ValueError:
+        # Finished from another context (e.g. a server thread closing a streamed response)
+        pass
+
+
+def server_timing(trace):
+    """Server-Timing header value with the stages recorded so far"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace["stages"].items())
+
+
+def record_stage(stage, seconds, timings=None):
+    stage_seconds.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = seconds
+    trace = current_trace.get()
+    if trace is not None:
+        trace["stages"][stage] = trace["stages"].get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage, timings=None):
+    """Time a block as one stage: the histogram, the current trace and `timings` if given"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, timings)
+
+
+class GenerationRecorder:
+    """Records prompt size, time to first token, tokens/sec and generation time of one LLM call"""
+
+    def __init__(self, messages):
+        chars = sum(len(message["content"]) for message in messages)
+        prompt_chars.observe(chars)
+        prompt_tokens.observe(sum(estimate_tokens(message["content"]) for message in messages))
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.tokens = 0
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            time_to_first_token.observe(self.first_token - self.start)
+            record_stage("llm_first_token", self.first_token - self.start)
+        self.tokens += 1
+
+    def finish(self):
+        end = time.perf_counter()
+        generated_tokens.inc(self.tokens)
+        if self.tokens > 1 and end > self.first_token:
+            tokens_per_second.observe((self.tokens - 1) / (end - self.first_token))
+        record_stage("llm_generation", end - self.start)
@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+COLLECTION_NAME = "thoughtco_articles"
+PASSAGE_COLLECTION_NAME = "thoughtco_passages"
+DEFAULT_DB_PATH = "./vector_db_new"
+
+# torch, torch-int8, onnx or onnx-int8, see inference_backend.py
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Directory built by bundle.py; when set, the models and article index are served from it
+# with onnxruntime and numpy instead of sentence-transformers and Chroma
+ARTIFACT_BUNDLE = os.getenv("ARTIFACT_BUNDLE")
+
+
+class ModelRegistry:
+    """Loads the heavy models and clients once per process and shares them between callers"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._resources = {}
+        self._load_times = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _get(self, name, loader):
+        """Return the named resource, loading it at most once even under concurrent calls"""
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+
+        # One lock per resource so loading the cross encoder doesn't block the embedder
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+
+        with lock:
+            if name not in self._resources:
+                start = time.perf_counter()
+                self._resources[name] = loader()
+                self._load_times[name] = time.perf_counter() - start
+            return self._resources[name]
+
+    def get_chroma_client(self):
+        def load():
+            import chromadb
+            return chromadb.PersistentClient(path=self.db_path)
+        return self._get("chroma_client", load)
+
+    def get_embedding_function(self):
+        def load():
+            if ARTIFACT_BUNDLE:
+                from bundle import load_embedder
+                return load_embedder(ARTIFACT_BUNDLE)
+            from inference_backend import configure_threads, load_sentence_transformer, make_embedding_function
+            if INFERENCE_BACKEND != "torch":
+                return make_embedding_function(load_sentence_transformer(EMBEDDING_MODEL_NAME, INFERENCE_BACKEND))
+            configure_threads()
+            from chromadb.utils import embedding_functions
+            return embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=EMBEDDING_MODEL_NAME
+            )
+        return self._get("embedding_function", load)
+
+    def get_cross_encoder(self):
+        def load():
+            if ARTIFACT_BUNDLE:
+                from bundle import load_cross_encoder
+                return load_cross_encoder(ARTIFACT_BUNDLE)
+            from inference_backend import configure_threads, load_cross_encoder
+            if INFERENCE_BACKEND != "torch":
+                return load_cross_encoder(CROSS_ENCODER_MODEL_NAME, INFERENCE_BACKEND)
+            configure_threads()
+            from sentence_transformers import CrossEncoder
+            return CrossEncoder(CROSS_ENCODER_MODEL_NAME)
+        return self._get("cross_encoder", load)
+
+    def get_collection(self):
+        def load():
+            if ARTIFACT_BUNDLE:
+                from bundle import load_index
+                return load_index(ARTIFACT_BUNDLE)
+            return self.get_chroma_client().get_collection(
+                name=COLLECTION_NAME,
+                embedding_function=self.get_embedding_function()
+            )
+        return self._get("collection", load)
+
+    def get_passage_collection(self, create=False):
+        """Passage-level collection built by chunking.py"""
+        def load():
+            client = self.get_chroma_client()
+            getter = client.get_or_create_collection if create else client.get_collection
+            return getter(
+                name=PASSAGE_COLLECTION_NAME,
+                embedding_function=self.get_embedding_function()
+            )
+        return self._get("passage_collection", load)
+
+    def get_query_cache(self):
+        """Query embedding cache in front of the embedder, configured from the environment"""
+        def load():
+            from query_cache import QueryEmbeddingCache
+            ttl = os.getenv("QUERY_CACHE_TTL")
+            # Other backends give slightly different vectors, so they get their own cache entries
+            model_name = EMBEDDING_MODEL_NAME
+            if ARTIFACT_BUNDLE:
+                model_name = f"{EMBEDDING_MODEL_NAME}@bundle"
+            elif INFERENCE_BACKEND != "torch":
+                model_name = f"{EMBEDDING_MODEL_NAME}@{INFERENCE_BACKEND}"
+            return QueryEmbeddingCache(
+                self.get_embedding_function(),
+                model_name=model_name,
+                max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+                ttl=float(ttl) if ttl else None,
+                disk_path=os.getenv("QUERY_CACHE_PATH") or None
+            )
+        return self._get("query_cache", load)
+
+    def get_reranker(self):
+        """Micro-batching cross-encoder service shared by all requests in this process"""
+        def load():
+            from reranker import MicroBatchReranker
+            return MicroBatchReranker(
+                self.get_cross_encoder(),
+                max_batch_size=int(os.getenv("RERANK_MAX_BATCH", "64")),
+                max_wait=float(os.getenv("RERANK_MAX_WAIT_MS", "5")) / 1000,
+                cache_size=int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+            )
+        return self._get("reranker", load)
+
+    def get_context_compressor(self):
+        """Sentence-level context compression with the retrieval embedder, see compression.py"""
+        def load():
+            from compression import CONTEXT_TOKEN_BUDGET, ContextCompressor
+            return ContextCompressor(
+                self.get_query_cache(),
+                self.get_embedding_function(),
+                token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", str(CONTEXT_TOKEN_BUDGET))),
+                cache_size=int(os.getenv("SENTENCE_CACHE_SIZE", "20000"))
+            )
+        return self._get("context_compressor", load)
+
+    def get_suggest_index(self):
+        """Title typeahead over articles.txt and the collection metadata, see suggest_index.py"""
+        def load():
+            from suggest_index import SuggestIndex, TITLES_FILE
+            index = SuggestIndex(
+                os.getenv("TITLES_PATH", TITLES_FILE),
+                collection_loader=self.get_collection,
+                refresh_interval=float(os.getenv("SUGGEST_REFRESH_SECONDS", "30"))
+            )
+            index.refresh(force=True)
+            return index
+        return self._get("suggest_index", load)
+
+    def get_inference_client(self):
+        def load():
+            from huggingface_hub import InferenceClient
+            return InferenceClient(api_key=os.getenv("HUGGINGFACE_API_KEY"))
+        return self._get("inference_client", load)
+
+    def get_bm25_index(self):
+        """BM25 index built by bm25_index.py, or None if it hasn't been built"""
+        def load():
+            from bm25_index import BM25Index, INDEX_DIR
+            path = os.path.join(self.db_path, INDEX_DIR)
+            if not os.path.exists(os.path.join(path, "terms.json")):
+                print(f"No BM25 index at {path}, hybrid retrieval falls back to dense only")
+                return False
+            return BM25Index.load(path)
+        return self._get("bm25_index", load) or None
+
+    def get_numpy_index(self, name="articles"):
+        """
+        Memory-mapped export of a collection built by numpy_index.py, or None if it hasn't been built.
+        VECTOR_QUANTIZATION=int8|binary searches the codes from quantized_index.py instead and
+        rescores VECTOR_OVERSAMPLE times n_results candidates at full precision.
+        """
+        def load():
+            from numpy_index import NumpyVectorIndex, INDEX_DIR
+            path = os.path.join(self.db_path, INDEX_DIR, name)
+            if not os.path.exists(os.path.join(path, "metadata.json")):
+                print(f"No numpy index at {path}, falling back to Chroma")
+                return False
+            quantization = os.getenv("VECTOR_QUANTIZATION", "none")
+            if quantization == "none":
+                return NumpyVectorIndex(path)
+            from quantized_index import QuantizedVectorIndex
+            return QuantizedVectorIndex(path, quantization, int(os.getenv("VECTOR_OVERSAMPLE", "4")))
+        return self._get(f"numpy_index_{name}", load) or None
+
+    def get_async_inference_client(self):
+        def load():
+            from huggingface_hub import AsyncInferenceClient
+            return AsyncInferenceClient(api_key=os.getenv("HUGGINGFACE_API_KEY"))
+        return self._get("async_inference_client", load)
+
+    def warm_up(self, background=False):
+        """Load every resource up front so the first request doesn't pay for it"""
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="model-warm-up", daemon=True)
+            thread.start()
+            return thread
+
+        self.get_embedding_function()
+        self.get_cross_encoder()
+        self.get_collection()
+        self.get_inference_client()
+
+    def is_ready(self):
+        """True once the retrieval models and collection are loaded"""
+        # The numpy export stands in for the collection when VECTOR_BACKEND=numpy
+        has_index = "collection" in self._resources or bool(self._resources.get("numpy_index_articles"))
+        return has_index and all(
+            name in self._resources
+            for name in ("embedding_function", "cross_encoder")
+        )
+
+    def status(self):
+        status = {
+            "ready": self.is_ready(),
+            "loaded": {name: round(seconds, 3) for name, seconds in self._load_times.items()}
+        }
+        for name in ("query_cache", "reranker"):
+            if name in self._resources:
+                status[name] = self._resources[name].stats()
+        return status
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(db_path=DEFAULT_DB_PATH):
+    """Return the shared registry for a database path"""
+    key = os.path.abspath(db_path)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(db_path)
+        return _registries[key]
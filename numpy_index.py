@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+INDEX_DIR = "numpy_index"
+
+# float16 matrices are converted to float32 this many rows at a time
+BLOCK_ROWS = 8192
+
+
+class NumpyVectorIndex:
+    """
+    Exact nearest-neighbour search over an exported collection.
+
+    The embeddings are a memory-mapped .npy matrix, so worker processes share the pages
+    through the OS page cache instead of each holding a copy. Document texts are one UTF-8
+    blob with an offsets array and are only decoded for the hits. `query` and `get` return
+    the same shapes as the Chroma collection methods, so VectorDBQuery can use either one.
+    Distances are squared L2, like the Chroma collection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"))
+        self.doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"))
+        self.documents_blob = np.memmap(os.path.join(path, "documents.bin"), dtype=np.uint8, mode="r") \
+            if self.doc_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        with open(os.path.join(path, "metadata.json")) as f:
+            table = json.load(f)
+        self.ids = table["ids"]
+        self.metadatas = table["metadatas"]
+        self.id_positions = {doc_id: index for index, doc_id in enumerate(self.ids)}
+
+    def count(self):
+        return len(self.ids)
+
+    def document(self, index):
+        start, end = self.doc_offsets[index], self.doc_offsets[index + 1]
+        return bytes(self.documents_blob[start:end]).decode("utf-8")
+
+    def distances(self, query_embeddings):
+        """Squared L2 distance from each query (rows) to every document (columns)"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.embeddings.dtype == np.float32:
+            products = queries @ self.embeddings.T
+        else:
+            products = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+            for start in range(0, len(self.ids), BLOCK_ROWS):
+                block = np.asarray(self.embeddings[start:start + BLOCK_ROWS], dtype=np.float32)
+                products[:, start:start + BLOCK_ROWS] = queries @ block.T
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        return np.maximum(query_norms[:, None] + self.norms[None, :] - 2 * products, 0)
+
+    def top_k(self, query_embeddings, n_results):
+        """(indices, distances) of the n_results closest documents per query, closest first"""
+        distances = self.distances(query_embeddings)
+        k = min(n_results, distances.shape[1])
+        if k == 0:
+            return np.zeros((len(distances), 0), dtype=np.int64), np.zeros((len(distances), 0), dtype=np.float32)
+        if k < distances.shape[1]:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas", "documents", "distances")):
+        indices, distances = self.top_k(query_embeddings, n_results)
+        results = {"ids": [[self.ids[index] for index in row] for row in indices]}
+        if "documents" in include:
+            results["documents"] = [[self.document(index) for index in row] for row in indices]
+        if "metadatas" in include:
+            results["metadatas"] = [[self.metadatas[index] for index in row] for row in indices]
+        if "distances" in include:
+            results["distances"] = [row.tolist() for row in distances]
+        return results
+
+    def get(self, ids=None, include=("metadatas", "documents")):
+        positions = range(len(self.ids)) if ids is None else \
+            [self.id_positions[doc_id] for doc_id in ids if doc_id in self.id_positions]
+        results = {"ids": [self.ids[index] for index in positions]}
+        if "documents" in include:
+            results["documents"] = [self.document(index) for index in positions]
+        if "metadatas" in include:
+            results["metadatas"] = [self.metadatas[index] for index in positions]
+        return results
+
+
+def export_collection(collection, path, dtype="float32"):
+    """Write a Chroma collection out as a NumpyVectorIndex directory"""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    os.makedirs(path, exist_ok=True)
+
+    embeddings = np.asarray(data['embeddings'], dtype=np.float32).reshape(len(data['ids']), -1)
+    np.save(os.path.join(path, "embeddings.npy"), embeddings.astype(dtype))
+    # Norms come from the stored precision so distances stay consistent with it
+    stored = embeddings.astype(dtype).astype(np.float32)
+    np.save(os.path.join(path, "norms.npy"), np.einsum("ij,ij->i", stored, stored))
+
+    encoded = [document.encode("utf-8") for document in data['documents']]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(document) for document in encoded])
+    np.save(os.path.join(path, "doc_offsets.npy"), offsets)
+    with open(os.path.join(path, "documents.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+
+    with open(os.path.join(path, "metadata.json"), "w") as f:
+        json.dump({"ids": data['ids'], "metadatas": data['metadatas']}, f)
+
+    print(f"Exported {len(data['ids'])} documents ({dtype}) to {path}")
+
+
+if __name__ == "__main__":
+    from model_registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Export the Chroma collections for the numpy search backend")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--passages", action="store_true", help="Also export the passage collection")
+    args = parser.parse_args()
+
+    registry = get_registry(args.db_path)
+    export_collection(registry.get_collection(), os.path.join(args.db_path, INDEX_DIR, "articles"), args.dtype)
+    if args.passages:
+        export_collection(registry.get_passage_collection(),
+                          os.path.join(args.db_path, INDEX_DIR, "passages"), args.dtype)
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from numpy_index import NumpyVectorIndex, INDEX_DIR, BLOCK_ROWS
+
+QUANTIZATIONS = ("int8", "binary")
+
+# Number of set bits in every byte value, for Hamming distances on packed codes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount(values):
+    """Set bits per element; np.bitwise_count is only available from numpy 2.0"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return POPCOUNT[values]
+
+
+def build_codes(path):
+    """Quantize the embeddings of a numpy_index.py export, writing the int8 and binary codes next to them"""
+    embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    low = np.full(embeddings.shape[1], np.inf, dtype=np.float32)
+    high = np.full(embeddings.shape[1], -np.inf, dtype=np.float32)
+    total = np.zeros(embeddings.shape[1], dtype=np.float64)
+    for start in range(0, len(embeddings), BLOCK_ROWS):
+        block = np.asarray(embeddings[start:start + BLOCK_ROWS], dtype=np.float32)
+        low = np.minimum(low, block.min(axis=0))
+        high = np.maximum(high, block.max(axis=0))
+        total += block.sum(axis=0)
+
+    # int8: each dimension's range is split into 256 steps
+    step = np.where(high > low, (high - low) / 255, 1).astype(np.float32)
+    # binary: one bit per dimension, set when the value is above that dimension's mean
+    thresholds = (total / max(len(embeddings), 1)).astype(np.float32)
+
+    int8_codes = np.empty(embeddings.shape, dtype=np.int8)
+    binary_codes = np.empty((len(embeddings), (embeddings.shape[1] + 7) // 8), dtype=np.uint8)
+    for start in range(0, len(embeddings), BLOCK_ROWS):
+        block = np.asarray(embeddings[start:start + BLOCK_ROWS], dtype=np.float32)
+        int8_codes[start:start + BLOCK_ROWS] = np.round((block - low) / step - 128).clip(-128, 127)
+        binary_codes[start:start + BLOCK_ROWS] = np.packbits(block > thresholds, axis=1)
+
+    np.save(os.path.join(path, "codes_int8.npy"), int8_codes)
+    np.savez(os.path.join(path, "int8_params.npz"), low=low, step=step)
+    np.save(os.path.join(path, "codes_binary.npy"), binary_codes)
+    np.save(os.path.join(path, "binary_thresholds.npy"), thresholds)
+    print(f"Quantized {len(embeddings)} vectors in {path}")
+
+
+class QuantizedVectorIndex(NumpyVectorIndex):
+    """
+    NumpyVectorIndex that searches compact codes and only touches full-precision rows to rescore.
+
+    The shortlist of `oversample * n_results` candidates comes from the int8 codes (approximate
+    dot products) or the binary codes (Hamming distance), and is then rescored exactly against
+    the memory-mapped original vectors, so distances are the same as the unquantized index.
+
+    Args:
+        path: Export directory with codes from build_codes()
+        quantization: "int8" or "binary"
+        oversample: Shortlist size as a multiple of n_results
+    """
+
+    def __init__(self, path, quantization="int8", oversample=4):
+        super().__init__(path)
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+        self.quantization = quantization
+        self.oversample = max(1, oversample)
+        # The codes are small enough to keep in memory
+        self.codes = np.load(os.path.join(path, f"codes_{quantization}.npy"))
+        if len(self.codes) != len(self.ids):
+            raise ValueError(f"Codes in {path} are older than the export, re-run quantized_index.py")
+        if quantization == "int8":
+            params = np.load(os.path.join(path, "int8_params.npz"))
+            self.low, self.step = params["low"], params["step"]
+        else:
+            self.thresholds = np.load(os.path.join(path, "binary_thresholds.npy"))
+
+    def approximate_distances(self, queries):
+        """Distances from the codes alone; only their order matters"""
+        if self.quantization == "binary":
+            query_codes = np.packbits(queries > self.thresholds, axis=1)
+            hamming = np.empty((len(queries), len(self.ids)), dtype=np.int32)
+            # Blocks of codes keep the (queries, block, bytes) XOR array small
+            rows = max(1, BLOCK_ROWS // len(queries))
+            for start in range(0, len(self.ids), rows):
+                block = self.codes[start:start + rows]
+                hamming[:, start:start + rows] = popcount(query_codes[:, None, :] ^ block[None, :, :]).sum(
+                    axis=2, dtype=np.int32)
+            return hamming
+
+        # x ~ low + (code + 128) * step, so q.x ~ q.low + (q * step).(code + 128)
+        scaled = queries * self.step
+        products = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS].astype(np.float32) + 128
+            products[:, start:start + BLOCK_ROWS] = scaled @ block.T
+        products += (queries @ self.low)[:, None]
+        return self.norms[None, :] - 2 * products
+
+    def top_k(self, query_embeddings, n_results):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        k = min(n_results, len(self.ids))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        approximate = self.approximate_distances(queries)
+        shortlist_size = min(k * self.oversample, len(self.ids))
+        if shortlist_size < len(self.ids):
+            shortlists = np.argpartition(approximate, shortlist_size - 1, axis=1)[:, :shortlist_size]
+        else:
+            shortlists = np.tile(np.arange(len(self.ids)), (len(queries), 1))
+
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for row, (query, shortlist) in enumerate(zip(queries, shortlists)):
+            # Sorted row order keeps the reads from the memory map sequential
+            shortlist = np.sort(shortlist)
+            vectors = np.asarray(self.embeddings[shortlist], dtype=np.float32)
+            exact = np.maximum(self.norms[shortlist] - 2 * vectors @ query + query @ query, 0)
+            order = np.argsort(exact)[:k]
+            indices[row] = shortlist[order]
+            distances[row] = exact[order]
+        return indices, distances
+
+
+def memory_bytes(index):
+    """Bytes per vector that the index keeps resident for searching"""
+    if isinstance(index, QuantizedVectorIndex):
+        return index.codes.shape[1] * index.codes.itemsize
+    return index.embeddings.shape[1] * index.embeddings.itemsize
+
+
+def recall_report(path, queries=None, k=10, oversamples=(1, 2, 4, 10), n_queries=200):
+    """
+    Recall@k of each quantization and oversampling factor against exact search, with memory use.
+    Without queries, a sample of the indexed vectors (with a little noise) is used.
+    """
+    exact_index = NumpyVectorIndex(path)
+    if queries is None:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(exact_index.count(), size=min(n_queries, exact_index.count()), replace=False)
+        vectors = np.asarray(exact_index.embeddings[np.sort(sample)], dtype=np.float32)
+        queries = vectors + rng.normal(scale=vectors.std() / 4, size=vectors.shape).astype(np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    start = time.perf_counter()
+    truth, _ = exact_index.top_k(queries, k)
+    exact_elapsed = time.perf_counter() - start
+
+    rows = [{
+        "quantization": f"none ({exact_index.embeddings.dtype})",
+        "oversample": None,
+        "recall": 1.0,
+        "bytes_per_vector": memory_bytes(exact_index),
+        "ms_per_query": 1000 * exact_elapsed / len(queries)
+    }]
+    for quantization in QUANTIZATIONS:
+        for oversample in oversamples:
+            index = QuantizedVectorIndex(path, quantization, oversample)
+            start = time.perf_counter()
+            found, _ = index.top_k(queries, k)
+            elapsed = time.perf_counter() - start
+            hits = sum(len(set(expected) & set(actual)) for expected, actual in zip(truth, found))
+            rows.append({
+                "quantization": quantization,
+                "oversample": oversample,
+                "recall": hits / truth.size if truth.size else 1.0,
+                "bytes_per_vector": memory_bytes(index),
+                "ms_per_query": 1000 * elapsed / len(queries)
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize a numpy_index.py export and report recall vs memory")
+    parser.add_argument("--db-path", default="./vector_db_new")
+    parser.add_argument("--name", default="articles", help="Exported collection (articles or passages)")
+    parser.add_argument("--report", action="store_true", help="Print recall@k for each setting")
+    parser.add_argument("--queries", help="File with one query per line to embed for the report")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[1, 2, 4, 10])
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    path = os.path.join(args.db_path, INDEX_DIR, args.name)
+    build_codes(path)
+
+    if args.report:
+        queries = None
+        if args.queries:
+            from model_registry import get_registry
+            with open(args.queries) as f:
+                queries = get_registry(args.db_path).get_embedding_function()(
+                    [line.strip() for line in f if line.strip()])
+        rows = recall_report(path, queries, k=args.k, oversamples=args.oversample)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print(f"{'quantization':<18}{'oversample':>11}{'recall@' + str(args.k):>11}{'bytes/vec':>11}{'ms/query':>10}")
+            for row in rows:
+                oversample = row["oversample"] if row["oversample"] is not None else "-"
+                print(f"{row['quantization']:<18}{oversample:>11}{row['recall']:>11.3f}"
+                      f"{row['bytes_per_vector']:>11}{row['ms_per_query']:>10.2f}")
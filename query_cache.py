@@ -0,0 +1,198 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Cache key for a query; the embedder is uncased, so case and spacing don't change the vector"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional time-to-live per entry"""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskEmbeddingCache:
+    """
+    SQLite-backed embedding cache that survives restarts and is shared by worker processes.
+
+    Rows are keyed by (model name, query) and rows written by any other model are dropped
+    when the cache is opened, so switching the embedding model invalidates the cache.
+    """
+
+    # Eviction runs every this many writes instead of on each one
+    EVICT_EVERY = 100
+
+    def __init__(self, path, model_name, max_entries=100000, ttl=None):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.writes = 0
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (model, query)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)")
+        self.conn.execute("DELETE FROM query_embeddings WHERE model != ?", (model_name,))
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT vector, created FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model_name, key)
+            ).fetchone()
+        if row is None:
+            return None
+        vector, created = row
+        if self.ttl and created + self.ttl < time.time():
+            return None
+        return np.frombuffer(vector, dtype=np.float32)
+
+    def put(self, key, vector):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, created) VALUES (?, ?, ?, ?)",
+                (self.model_name, key, blob, time.time())
+            )
+            self.writes += 1
+            if self.writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop expired rows, then the oldest rows beyond max_entries"""
+        if self.ttl:
+            self.conn.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+        self.conn.execute("""
+            DELETE FROM query_embeddings WHERE rowid IN (
+                SELECT rowid FROM query_embeddings ORDER BY created DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM query_embeddings")
+            self.conn.commit()
+
+
+class QueryEmbeddingCache:
+    """
+    Embeds query texts through an in-process LRU and an optional on-disk tier.
+
+    Args:
+        embedding_function: Callable mapping a list of texts to a list of vectors
+        model_name: Name of the embedding model; part of every cache key
+        max_entries: Size of the in-memory LRU
+        ttl: Seconds an entry stays valid in either tier (None keeps entries until evicted)
+        disk_path: SQLite file for the shared tier (None disables it)
+        disk_max_entries: Size limit of the on-disk tier
+    """
+
+    def __init__(self, embedding_function, model_name, max_entries=1024, ttl=None,
+                 disk_path=None, disk_max_entries=100000):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries, ttl)
+        self.disk = DiskEmbeddingCache(disk_path, model_name, disk_max_entries, ttl) if disk_path else None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.counter_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self.counter_lock:
+            self.counters[name] += amount
+
+    def embed(self, texts):
+        """Return one vector per text, only running the model for texts missing from both tiers"""
+        vectors = [None] * len(texts)
+        missing = {}
+
+        for index, text in enumerate(texts):
+            key = normalize_query(text)
+            vector = self.memory.get(key)
+            if vector is not None:
+                self._count("memory_hits")
+            elif self.disk is not None and (vector := self.disk.get(key)) is not None:
+                self._count("disk_hits")
+                self.memory.put(key, vector)
+            if vector is not None:
+                vectors[index] = vector
+            else:
+                missing.setdefault(key, []).append(index)
+
+        if missing:
+            self._count("misses", len(missing))
+            keys = list(missing)
+            # Embed all misses in one batch
+            embeddings = self.embedding_function([texts[missing[key][0]] for key in keys])
+            for key, embedding in zip(keys, embeddings):
+                vector = np.asarray(embedding, dtype=np.float32)
+                self.memory.put(key, vector)
+                if self.disk is not None:
+                    self.disk.put(key, vector)
+                for index in missing[key]:
+                    vectors[index] = vector
+
+        return [vector.tolist() for vector in vectors]
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self.counter_lock:
+            counters = dict(self.counters)
+        lookups = sum(counters.values())
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        counters["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        counters["memory_entries"] = len(self.memory)
+        return counters
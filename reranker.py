@@ -0,0 +1,149 @@
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from query_cache import LRUCache, normalize_query
+
+
+def query_hash(query_text):
+    """Stable hash of the normalized query, used in score cache keys"""
+    return hashlib.sha1(normalize_query(query_text).encode("utf-8")).hexdigest()
+
+
+def document_hash(document):
+    """Hash of the scored text, so a document refreshed under the same id isn't served old scores"""
+    return hashlib.sha1(document.encode("utf-8")).hexdigest()
+
+
+class MicroBatchReranker:
+    """
+    Cross-encoder scoring shared by concurrent requests.
+
+    Each call to `score` puts its (query, document) pairs on a queue. A single worker thread
+    gathers pairs from all waiting callers until it has `max_batch_size` pairs or `max_wait`
+    seconds have passed since the first one arrived, runs one `predict` over all of them and
+    hands each caller back its own slice of the scores. Scores are cached by
+    (query hash, document id, document hash), so repeated queries skip the model entirely and
+    a re-crawled article with new text is scored again.
+
+    Args:
+        cross_encoder: Model with a `predict(pairs)` method
+        max_batch_size: Maximum pairs per forward pass (a single larger request still runs alone)
+        max_wait: Seconds to wait for more requests before running a partial batch
+        cache_size: Number of cached scores (0 disables the cache)
+    """
+
+    def __init__(self, cross_encoder, max_batch_size=64, max_wait=0.005, cache_size=10000):
+        self.cross_encoder = cross_encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cache = LRUCache(cache_size) if cache_size else None
+
+        self.requests = queue.Queue()
+        self.worker = None
+        self.worker_lock = threading.Lock()
+
+        self.counters = {"batches": 0, "pairs": 0, "cache_hits": 0, "requests": 0}
+        self.counter_lock = threading.Lock()
+
+    def _count(self, **amounts):
+        with self.counter_lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def _ensure_worker(self):
+        if self.worker is not None:
+            return
+        with self.worker_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="reranker", daemon=True)
+                self.worker.start()
+
+    def score(self, query_text, documents, doc_ids=None):
+        """Return one cross-encoder score per document"""
+        return self.score_batch([query_text], [documents], [doc_ids])[0]
+
+    def score_batch(self, query_texts, documents_per_query, doc_ids_per_query=None):
+        """
+        Scores for several queries, each with its own documents. The uncached pairs of all
+        queries go to the model as one request.
+        """
+        doc_ids_per_query = doc_ids_per_query or [None] * len(query_texts)
+        self._count(requests=len(query_texts))
+        scores = [[None] * len(documents) for documents in documents_per_query]
+        missing = []
+
+        for query_index, (query_text, documents, doc_ids) in enumerate(
+                zip(query_texts, documents_per_query, doc_ids_per_query)):
+            key_prefix = query_hash(query_text) if self.cache is not None and doc_ids else None
+            for index, document in enumerate(documents):
+                if key_prefix is not None:
+                    cached = self.cache.get((key_prefix, doc_ids[index], document_hash(document)))
+                    if cached is not None:
+                        scores[query_index][index] = cached
+                        continue
+                missing.append((query_index, index, key_prefix))
+
+        self._count(cache_hits=sum(len(documents) for documents in documents_per_query) - len(missing))
+        if not missing:
+            return scores
+
+        future = Future()
+        self._ensure_worker()
+        self.requests.put((
+            [[query_texts[query_index], documents_per_query[query_index][index]] for query_index, index, _ in missing],
+            future
+        ))
+        new_scores = future.result()
+
+        for (query_index, index, key_prefix), score in zip(missing, new_scores):
+            scores[query_index][index] = score
+            if key_prefix is not None:
+                self.cache.put((key_prefix, doc_ids_per_query[query_index][index],
+                                document_hash(documents_per_query[query_index][index])), score)
+        return scores
+
+    def _run(self):
+        carry = None
+        while True:
+            batch = [carry if carry is not None else self.requests.get()]
+            carry = None
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if size + len(request[0]) > self.max_batch_size:
+                    # Doesn't fit; it starts the next batch
+                    carry = request
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            self._predict(batch, size)
+
+    def _predict(self, batch, size):
+        pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+        try:
+            scores = [float(score) for score in self.cross_encoder.predict(pairs)]
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self._count(batches=1, pairs=size)
+        offset = 0
+        for request_pairs, future in batch:
+            future.set_result(scores[offset:offset + len(request_pairs)])
+            offset += len(request_pairs)
+
+    def stats(self):
+        with self.counter_lock:
+            counters = dict(self.counters)
+        counters["avg_batch_size"] = round(counters["pairs"] / counters["batches"], 2) if counters["batches"] else 0.0
+        return counters
@@ -0,0 +1,243 @@
+from typing import Dict, List, Optional, Tuple
+
+from bm25_index import reciprocal_rank_fusion
+from metrics import timed
+from model_registry import get_registry
+
+# Passage mode fetches this many passages per requested article so that
+# several passages of the same article don't crowd out other articles
+PASSAGES_PER_CANDIDATE = 3
+
+
+class VectorDBQuery:
+    """
+    Retrieval over the Chroma collections.
+
+    Args:
+        db_path: Chroma database directory
+        mode: "article" ranks whole articles, "passage" ranks passages from the
+              passage collection (see chunking.py) and groups them by article
+        hybrid: In article mode, fuse BM25 and dense candidates before reranking
+        fused_candidates: Number of fused candidates sent to the cross encoder
+        backend: "chroma" queries the Chroma collections, "numpy" does exact search over
+                 the memory-mapped export from numpy_index.py (falls back to Chroma if missing)
+    """
+
+    def __init__(self, db_path="./vector_db_new", mode="article", hybrid=False, fused_candidates=6,
+                 backend="chroma"):
+        # Models and collection come from the shared registry, so this is cheap to construct
+        registry = get_registry(db_path)
+        self.mode = mode
+        self.embedding_function = registry.get_embedding_function()
+        self.cross_encoder = registry.get_cross_encoder()
+        # The numpy index has the same query/get interface as a Chroma collection
+        use_numpy = backend == "numpy"
+        self.collection = (use_numpy and registry.get_numpy_index("articles")) or registry.get_collection()
+        self.passage_collection = (
+            (use_numpy and registry.get_numpy_index("passages")) or registry.get_passage_collection()
+        ) if mode == "passage" else None
+        self.query_cache = registry.get_query_cache()
+        self.reranker = registry.get_reranker()
+        self.bm25_index = registry.get_bm25_index() if hybrid else None
+        self.fused_candidates = fused_candidates
+        self.compressor = registry.get_context_compressor()
+
+    def search_similar(self, query_text: str, n_results: int = 10, n_rerank: int = 3,
+                       timings: Optional[Dict[str, float]] = None, rerank: bool = True) -> List[Tuple]:
+        """
+        Top n_rerank articles for the query as (metadata, document, similarity). When a timings
+        dict is passed, the seconds spent embedding, searching and reranking are added to it
+        (every stage is also recorded in metrics.py). With rerank=False the cross encoder is
+        skipped and the vector search (or fused) order is kept.
+        """
+        return self.search_batch([query_text], n_results, n_rerank, timings, rerank)[0]
+
+    def search_batch(self, query_texts: List[str], n_results: int = 10, n_rerank: int = 3,
+                     timings: Optional[Dict[str, float]] = None, rerank: bool = True) -> List[List[Tuple]]:
+        """
+        search_similar for many queries at once: the queries are embedded in one batch, searched
+        with one vector query, and all their candidates are reranked in one cross-encoder pass.
+        """
+        if not query_texts:
+            return []
+        if self.mode == "passage":
+            return self.search_passages_batch(query_texts, n_results=n_results * PASSAGES_PER_CANDIDATE,
+                                              n_rerank=n_rerank, timings=timings, rerank=rerank)
+
+        with timed("embed", timings):
+            query_embeddings = self.query_cache.embed(query_texts)
+
+        with timed("vector_search", timings):
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["metadatas", "documents", "distances"]
+            )
+
+            candidates = []
+            for index, query_text in enumerate(query_texts):
+                if self.bm25_index is not None:
+                    candidates.append(self._fuse_with_bm25(query_text, results, n_results, index))
+                else:
+                    candidates.append((
+                        results['ids'][index],
+                        results['documents'][index],
+                        results['metadatas'][index],
+                        distances_to_similarities(results['distances'][index])
+                    ))
+
+        if rerank:
+            with timed("rerank", timings):
+                cross_scores = self.reranker.score_batch(
+                    query_texts,
+                    [documents for _, documents, _, _ in candidates],
+                    [ids for ids, _, _, _ in candidates]
+                )
+        else:
+            # Similarities already follow the candidate order
+            cross_scores = [similarities for _, _, _, similarities in candidates]
+
+        top_results = []
+        for scores, (_, documents, metadatas, similarities) in zip(cross_scores, candidates):
+            ranked_results = list(zip(scores, metadatas, documents, similarities))
+            ranked_results.sort(key=lambda result: result[0], reverse=True)
+            top_results.append([(metadata, document, similarity)
+                                for score, metadata, document, similarity in ranked_results[:n_rerank]])
+        return top_results
+
+    def compress_context(self, query_text: str, results: List[Tuple],
+                         timings: Optional[Dict[str, float]] = None) -> List[Tuple]:
+        """
+        Results with each document cut down to the sentences most similar to the query, within
+        CONTEXT_TOKEN_BUDGET tokens in total (see compression.py). Titles and URLs are kept.
+        """
+        compressed, _ = self.compressor.compress(query_text, results, timings)
+        return compressed
+
+    def _fuse_with_bm25(self, query_text, dense_results, n_results, index=0):
+        """
+        Reciprocal rank fusion of the dense results of query `index` and the BM25 top n_results.
+        Returns the best fused_candidates as (ids, documents, metadatas, similarities), where
+        similarity is the fused score scaled to 0-100.
+        """
+        dense_ids = dense_results['ids'][index]
+        lexical_ids = [doc_id for doc_id, _ in self.bm25_index.search(query_text, n_results)]
+        fused = reciprocal_rank_fusion([dense_ids, lexical_ids])[:self.fused_candidates]
+        if not fused:
+            return [], [], [], []
+
+        known = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(dense_ids, dense_results['documents'][index],
+                                                  dense_results['metadatas'][index])
+        }
+        # Articles only the lexical side found still need their text
+        missing = [doc_id for doc_id, _ in fused if doc_id not in known]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            known.update({
+                doc_id: (document, metadata)
+                for doc_id, document, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])
+            })
+
+        fused = [(doc_id, score) for doc_id, score in fused if doc_id in known]
+        best = fused[0][1] if fused else 1.0
+        ids = [doc_id for doc_id, _ in fused]
+        return (
+            ids,
+            [known[doc_id][0] for doc_id in ids],
+            [known[doc_id][1] for doc_id in ids],
+            [100 * score / best for _, score in fused]
+        )
+
+    def search_passages(self, query_text: str, n_results: int = 30, n_rerank: int = 3,
+                        passages_per_article: int = 2, timings: Optional[Dict[str, float]] = None) -> List[Tuple]:
+        """
+        Rank passages with the cross encoder, then group them by parent article
+
+        Args:
+            query_text: The search query
+            n_results: Number of passages to retrieve and re-rank
+            n_rerank: Number of articles to return
+            passages_per_article: Best passages kept as the document text of each article
+            timings: Optional dict that stage durations are added to, as in search_similar
+        """
+        return self.search_passages_batch([query_text], n_results, n_rerank, passages_per_article, timings)[0]
+
+    def search_passages_batch(self, query_texts: List[str], n_results: int = 30, n_rerank: int = 3,
+                              passages_per_article: int = 2, timings: Optional[Dict[str, float]] = None,
+                              rerank: bool = True) -> List[List[Tuple]]:
+        """search_passages for many queries with one embedding batch, vector query and rerank pass"""
+        with timed("embed", timings):
+            query_embeddings = self.query_cache.embed(query_texts)
+
+        with timed("vector_search", timings):
+            results = self.passage_collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["metadatas", "documents", "distances"]
+            )
+
+        if rerank:
+            # Passages are short, so the cross encoder sees all of each one
+            with timed("rerank", timings):
+                cross_scores = self.reranker.score_batch(query_texts, results['documents'], results['ids'])
+        else:
+            cross_scores = [distances_to_similarities(distances) for distances in results['distances']]
+
+        return [
+            group_passages(scores, results['metadatas'][index], results['documents'][index],
+                           distances_to_similarities(results['distances'][index]), n_rerank, passages_per_article)
+            for index, scores in enumerate(cross_scores)
+        ]
+
+
+def group_passages(cross_scores, metadatas, passages, similarities, n_rerank, passages_per_article):
+    """Rank articles by their best passage; each article's document is its best passages in reading order"""
+    articles = {}
+    for score, metadata, passage, similarity in zip(cross_scores, metadatas, passages, similarities):
+        article = articles.setdefault(metadata['parent_id'], {
+            "metadata": {
+                'title': metadata['title'],
+                'url': metadata['url'],
+                'parent_id': metadata['parent_id']
+            },
+            "score": score,
+            "similarity": similarity,
+            "passages": []
+        })
+        article["score"] = max(article["score"], score)
+        article["similarity"] = max(article["similarity"], similarity)
+        article["passages"].append((float(score), metadata['chunk_index'], passage))
+
+    # An article is as relevant as its best passage
+    ranked_articles = sorted(articles.values(), key=lambda article: article["score"], reverse=True)
+
+    top_results = []
+    for article in ranked_articles[:n_rerank]:
+        best_passages = sorted(article["passages"], reverse=True)[:passages_per_article]
+        # Keep the passages in reading order
+        best_passages.sort(key=lambda passage: passage[1])
+        document = " ... ".join(passage for _, _, passage in best_passages)
+        top_results.append((article["metadata"], document, article["similarity"]))
+    return top_results
+
+
+def distances_to_similarities(distances):
+    """Convert distances to similarity scores (0-100%); lower distance means higher similarity"""
+    if not distances:
+        return []
+    max_distance = max(distances)
+    if max_distance == 0:
+        return [100.0 for _ in distances]
+    return [100 * (1 - (dist / max_distance)) for dist in distances]
+
+
+def format_documents(results: List[Tuple]) -> str:
+    with timed("format_documents"):
+        context = ""
+        for metadata, document, similarity in results:
+            context += f"\nTitle: {metadata['title']}\n"
+            context += f"Content: {document}\n"
+            context += f"Source: {metadata['url']}\n\n"
+    return context
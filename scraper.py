@@ -1,14 +1,26 @@
 import requests
-from bs4 import BeautifulSoup
 import chromadb
 from chromadb.utils import embedding_functions
 import time
 import random
-from urllib.parse import urljoin
-import re, os
+import os
+import threading
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from crawler import ConcurrentCrawler, CrawlStats, HostRateLimiter, make_session
+from crawl_state import CrawlCheckpoint, CrawlState, STATE_FILE, content_hash, stable_id
+from extract import ARTICLE_URL_PATTERN, DEFAULT_PARSER, PARSERS, extract_html
+from ingest import IngestionPipeline
+from chunking import make_chunker
+from bm25_index import build_bm25_index, INDEX_DIR
+from suggest_index import TitlesFile
 
 class ThoughtCoScraper:
-    def __init__(self, db_path="./vector_db_new"):
+    def __init__(self, db_path="./vector_db_new", parser=DEFAULT_PARSER):
+        self.db_path = db_path
+
         # Create directory for database if it doesn't exist
         os.makedirs(db_path, exist_ok=True)
         
@@ -18,10 +30,17 @@ class ThoughtCoScraper:
             model_name="all-MiniLM-L6-v2"
         )
         # Create or get collection
-        self.collection = self.chroma_client.create_collection(
+        self.collection = self.chroma_client.get_or_create_collection(
             name="thoughtco_articles",
             embedding_function=self.embedding_function
         )
+        # Passage collection, only opened when passages are being written (see start_pipeline)
+        self.passage_collection = None
+
+        # What was last stored per URL, for incremental refreshes
+        self.state = CrawlState(os.path.join(db_path, STATE_FILE))
+        # Frontier and per-URL status of the current crawl, so an interrupted crawl can resume
+        self.checkpoint = CrawlCheckpoint(os.path.join(db_path, STATE_FILE))
         
         # Set for storing visited URLs
         self.visited_urls = set()
@@ -31,116 +50,378 @@ class ThoughtCoScraper:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
-    def is_valid_thoughtco_url(self, url):
-        """Check if URL is a valid ThoughtCo article URL"""
-        pattern = r'https?://www\.thoughtco\.com/.*-\d+$'
-        return bool(re.match(pattern, url))
+        # Reuse keep-alive connections between requests
+        self.session = make_session(self.headers)
 
-    def extract_article_content(self, soup):
-        """Extract title and content from the article page"""
-        title = ""
-        content = ""
-        
-        # Extract title
-        title_element = soup.find('h1', class_='article-heading type--lion')
-        if title_element:
-            title = title_element.get_text().strip()
-            
-        # Extract content
-        content_element = soup.find('div', class_='loc article-content')
-        if content_element:
-            # Remove script and style elements
-            for element in content_element(['script', 'style']):
-                element.decompose()
-            content = content_element.get_text().strip()
-
-        # remove all new lines from content
-        content = content.replace('\n', ' ')
-            
-        return title, content
-
-    def extract_article_links(self, soup, base_url):
-        """Extract all article links from the page"""
-        links = set()
-        for a in soup.find_all('a', href=True):
-            url = urljoin(base_url, a['href'])
-            if self.is_valid_thoughtco_url(url):
-                links.add(url)
-        return links
-
-    def scrape_page(self, url):
-        """Scrape a single page and return its content and new links"""
+        # Pattern for article URLs worth following; point it elsewhere to crawl a test server
+        self.url_pattern = ARTICLE_URL_PATTERN.pattern
+
+        # HTML parser for extract.extract_html, and the process pool it runs on (see start_extract_pool)
+        self.parser = parser
+        self.extract_pool = None
+
+        # Batched ingestion pipelines, see start_pipeline
+        self.pipelines = []
+
+        # New titles are appended to articles.txt, where the /api/suggest index picks them up
+        self.titles_file = TitlesFile()
+
+    def start_extract_pool(self, workers):
+        """Parse pages on a pool of processes so fetch threads don't hold the GIL while parsing"""
+        self.extract_pool = ProcessPoolExecutor(max_workers=workers)
+
+    def stop_extract_pool(self):
+        if self.extract_pool is not None:
+            self.extract_pool.shutdown()
+            self.extract_pool = None
+
+    def extract(self, html, url):
+        """Title, content and article links of a fetched page"""
+        if self.extract_pool is not None:
+            return self.extract_pool.submit(extract_html, html, url, self.parser, self.url_pattern).result()
+        return extract_html(html, url, self.parser, self.url_pattern)
+
+    def scrape_page(self, url, session=None, conditional=False):
+        """
+        Scrape a single page and return its content and new links. With conditional, the stored
+        ETag / Last-Modified are sent and an unchanged (304) or removed (404/410) page comes back
+        as {'url': url, 'status': 'not_modified' or 'gone'}.
+        """
         try:
-            response = requests.get(url, headers=self.headers)
+            headers = dict(self.headers)
+            record = self.state.get(url) if conditional else None
+            if record:
+                if record['etag']:
+                    headers['If-None-Match'] = record['etag']
+                if record['last_modified']:
+                    headers['If-Modified-Since'] = record['last_modified']
+
+            response = (session or self.session).get(url, headers=headers, timeout=30)
+            if conditional and response.status_code == 304:
+                return {'url': url, 'status': 'not_modified'}, set()
+            if conditional and response.status_code in (404, 410):
+                return {'url': url, 'status': 'gone'}, set()
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            title, content = self.extract_article_content(soup)
-            links = self.extract_article_links(soup, url)
-            
+            title, content, links = self.extract(response.text, url)
+
             return {
                 'title': title,
                 'content': content,
-                'url': url
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
             }, links
             
         except Exception as e:
             print(f"Error scraping {url}: {str(e)}")
             return None, set()
 
-    def store_in_vectordb(self, article_data):
-        """Store article in ChromaDB"""
+    def document_id(self, article_data):
+        """Chroma id for an article, stable across runs so re-crawls update instead of duplicating"""
+        return stable_id(article_data['url'])
+
+    def start_pipeline(self, batch_size=32, queue_size=256, flush_interval=2.0, chunk_passages=False):
+        """
+        Send stored articles through a batched embed-and-upsert pipeline until finish_pipeline.
+        With chunk_passages, articles are also split into passages for the passage collection.
+        """
+        self.pipelines = [IngestionPipeline(
+            collection=self.collection,
+            embedding_function=self.embedding_function,
+            id_fn=self.document_id,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            flush_interval=flush_interval
+        ).start()]
+
+        if chunk_passages:
+            self.passage_collection = self.chroma_client.get_or_create_collection(
+                name="thoughtco_passages",
+                embedding_function=self.embedding_function
+            )
+            self.pipelines.append(IngestionPipeline(
+                collection=self.passage_collection,
+                embedding_function=self.embedding_function,
+                id_fn=self.document_id,
+                chunker=make_chunker(),
+                batch_size=batch_size,
+                queue_size=queue_size,
+                flush_interval=flush_interval
+            ).start())
+        return self.pipelines
+
+    def finish_pipeline(self):
+        """Flush the pipelines and return their throughput reports"""
+        reports = [pipeline.close() for pipeline in self.pipelines]
+        self.pipelines = []
+        return reports
+
+    def store_in_vectordb(self, article_data, on_stored=None):
+        """
+        Store article in ChromaDB unless the stored copy has the same text.
+        Returns "added", "updated", "unchanged", or None if nothing was stored. With pipelines
+        the article is only queued; its crawl state and title are saved once it is written.
+        on_stored() is called once the article is in the collection, possibly from the writer thread.
+        """
         if not article_data['title'] or not article_data['content']:
-            return
-        
+            return None
+
+        url = article_data['url']
+        doc_id = self.document_id(article_data)
+        digest = content_hash(article_data['title'], article_data['content'])
+        record = self.state.get(url)
+        if record and record['doc_id'] == doc_id and record['content_hash'] == digest:
+            self.state.save(url, doc_id, article_data.get('etag'), article_data.get('last_modified'),
+                            digest, changed=False)
+            if on_stored is not None:
+                on_stored()
+            return "unchanged"
+
+        if record is None:
+            self.remove_legacy_copies(url, doc_id)
+        elif self.passage_collection is not None:
+            # Passage ids are positional, so a shorter new version would leave old passages behind
+            self.passage_collection.delete(where={"parent_id": doc_id})
+
+        def record_stored():
+            self.state.save(url, doc_id, article_data.get('etag'), article_data.get('last_modified'), digest)
+            if record is None:
+                # Articles stored before crawl state existed are already listed
+                self.titles_file.append(article_data['title'])
+            if on_stored is not None:
+                on_stored()
+
+        if self.pipelines:
+            # Recorded only once every pipeline has written the article, so a failed embed or
+            # upsert leaves the page to be retried by the next refresh instead of "unchanged"
+            waiting = [len(self.pipelines)]
+            waiting_lock = threading.Lock()
+
+            def on_stored():
+                with waiting_lock:
+                    waiting[0] -= 1
+                    finished = waiting[0] == 0
+                if finished:
+                    record_stored()
+
+            for pipeline in self.pipelines:
+                pipeline.submit(article_data, on_stored=on_stored)
+            return "updated" if record else "added"
+
         try:
-            self.collection.add(
+            self.collection.upsert(
                 documents=[article_data['content']],
                 metadatas=[{
                     'title': article_data['title'],
-                    'url': article_data['url']
+                    'url': url
                 }],
-                ids=[str(hash(article_data['url']))]
+                ids=[doc_id]
             )
         except Exception as e:
             print(f"Error storing article in vector DB: {str(e)}")
+            return None
+
+        record_stored()
+        return "updated" if record else "added"
 
-    def scrape_articles(self, start_url, max_articles=300):
-        """Main scraping function"""
+    def remove_legacy_copies(self, url, doc_id):
+        """Delete copies of an article stored under other ids (older runs used per-process hash() ids)"""
+        try:
+            existing = self.collection.get(where={"url": url}, include=[])
+            stale_ids = [existing_id for existing_id in existing['ids'] if existing_id != doc_id]
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+            if self.passage_collection is not None:
+                # The new passages are only written after this, so every stored one is old
+                self.passage_collection.delete(where={"url": url})
+        except Exception as e:
+            print(f"Error removing old copies of {url}: {str(e)}")
+
+    def remove_article(self, url):
+        """Delete an article that no longer exists on the site"""
+        record = self.state.get(url)
+        if record is None:
+            return
+        self.collection.delete(ids=[record['doc_id']])
+        if self.passage_collection is not None:
+            self.passage_collection.delete(where={"parent_id": record['doc_id']})
+        self.state.delete(url)
+
+    def refresh(self, max_workers=4, requests_per_second=2.0, burst=2, min_content_length=100):
+        """
+        Re-check every stored URL with conditional GETs. Only articles whose text changed are
+        embedded again; pages that are gone are removed. Returns counts per outcome.
+        """
+        urls = self.state.urls()
+        rate_limiter = HostRateLimiter(requests_per_second, burst)
+        session = make_session(self.headers, pool_size=max_workers)
+        counts = {"not_modified": 0, "unchanged": 0, "updated": 0, "added": 0, "removed": 0, "errors": 0}
+
+        def fetch(url):
+            rate_limiter.acquire(url)
+            return self.scrape_page(url, session=session, conditional=True)
+
+        print(f"Refreshing {len(urls)} articles")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for index, (url, (article_data, _)) in enumerate(zip(urls, pool.map(fetch, urls)), start=1):
+                status = article_data.get('status') if article_data else None
+                if status == 'not_modified':
+                    self.state.touch(url)
+                    counts["not_modified"] += 1
+                elif status == 'gone':
+                    self.remove_article(url)
+                    counts["removed"] += 1
+                elif article_data and len(article_data['content']) > min_content_length:
+                    outcome = self.store_in_vectordb(article_data)
+                    counts[outcome or "errors"] += 1
+                else:
+                    counts["errors"] += 1
+                if index % 50 == 0:
+                    print(f"Checked {index}/{len(urls)} articles: {counts}")
+
+        print(f"Refresh finished in {time.perf_counter() - start:.1f}s: {counts}")
+        return counts
+
+    def scrape_articles(self, start_url, max_articles=300, checkpoint_interval=30.0):
+        """Main scraping function; resumes a checkpointed crawl from the same start_url"""
         urls_to_visit = {start_url}
-        
-        while len(self.visited_urls) < max_articles and urls_to_visit:
-            # Get next URL to scrape
-            current_url = urls_to_visit.pop()
-            
-            if current_url in self.visited_urls:
-                continue
-                
-            print(f"Scraping {current_url}")
-            
-            # Scrape the page
-            article_data, new_links = self.scrape_page(current_url)
-            
-            if article_data and len(article_data['content']) > 100:
-                # Store in vector DB
-                self.store_in_vectordb(article_data)
-                
-                # Mark as visited
-                self.visited_urls.add(current_url)
-                
-                # Add new links to visit
-                urls_to_visit.update(new_links - self.visited_urls)
-                
-                print(f"Processed {len(self.visited_urls)} articles")
-                
-                # Add delay to be respectful
-                time.sleep(random.uniform(1, 3))
-            
-            if len(self.visited_urls) >= max_articles:
-                break
+        url_status = {}
+        # Queued to the pipeline but not written yet; checkpointed as still queued
+        pending_writes = set()
+        written = deque()
+        stats = CrawlStats()
+
+        saved = self.checkpoint.load(start_url)
+        if saved and saved["queued"]:
+            urls_to_visit = {url for _, url in saved["queued"]}
+            url_status = dict(saved["statuses"])
+            self.visited_urls.update(url for url, status in url_status.items() if status == "stored")
+            stats = CrawlStats(resumed_articles=len(self.visited_urls))
+            print(f"Resuming crawl: {len(self.visited_urls)} articles stored, {len(urls_to_visit)} URLs queued")
+
+        def on_stored(url):
+            # May run on the ingestion writer thread
+            self.checkpoint.mark_stored(url)
+            written.append(url)
+
+        def save_checkpoint():
+            while written:
+                url = written.popleft()
+                pending_writes.discard(url)
+                url_status[url] = "stored"
+            self.checkpoint.save(start_url, [(0, url) for url in urls_to_visit | pending_writes], url_status)
+
+        last_checkpoint = time.monotonic()
+        current_url = None
+        try:
+            while len(self.visited_urls) < max_articles and urls_to_visit:
+                # Get next URL to scrape
+                current_url = urls_to_visit.pop()
+
+                if current_url in self.visited_urls:
+                    current_url = None
+                    continue
+
+                print(f"Scraping {current_url}")
+
+                # Scrape the page
+                article_data, new_links = self.scrape_page(current_url)
+                stats.pages_fetched += 1
+
+                if article_data and len(article_data['content']) > 100:
+                    # Store in vector DB; the checkpoint marks it stored once it is written
+                    pending_writes.add(current_url)
+                    self.store_in_vectordb(article_data, on_stored=lambda url=current_url: on_stored(url))
+
+                    # Mark as visited
+                    self.visited_urls.add(current_url)
+                    stats.articles_stored = len(self.visited_urls)
+
+                    # Add new links to visit
+                    urls_to_visit.update(new_links - self.visited_urls)
+
+                    print(stats.progress(max_articles))
+
+                    # Add delay to be respectful
+                    time.sleep(random.uniform(1, 3))
+                else:
+                    url_status[current_url] = "skipped" if article_data else "failed"
+                current_url = None
+
+                if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                    save_checkpoint()
+                    last_checkpoint = time.monotonic()
+
+                if len(self.visited_urls) >= max_articles:
+                    break
+        finally:
+            # A page interrupted mid-scrape is saved as still queued
+            if current_url is not None:
+                urls_to_visit.add(current_url)
+            save_checkpoint()
+
+    def scrape_articles_concurrent(self, start_url, max_articles=300, max_workers=8,
+                                   requests_per_second=2.0, burst=2, checkpoint_interval=30.0):
+        """Scrape with a thread pool and a per-host token bucket instead of a fixed sleep"""
+        crawler = ConcurrentCrawler(
+            fetch_page=self.scrape_page,
+            store_article=self.store_in_vectordb,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            burst=burst,
+            headers=self.headers,
+            checkpoint=self.checkpoint,
+            checkpoint_interval=checkpoint_interval
+        )
+        crawler.visited_urls = self.visited_urls
+        return crawler.crawl(start_url, max_articles=max_articles)
 
 # Example usage
 if __name__ == "__main__":
-    scraper = ThoughtCoScraper()
-    start_url = "https://www.thoughtco.com/percentage-of-human-brain-used-4159438"
-    scraper.scrape_articles(start_url)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape ThoughtCo articles into the vector database")
+    parser.add_argument("--start-url", default="https://www.thoughtco.com/percentage-of-human-brain-used-4159438")
+    parser.add_argument("--max-articles", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of concurrent fetches (0 keeps the original one-at-a-time crawl)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requests per second per host")
+    parser.add_argument("--burst", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Embed and upsert articles in batches of this size (0 adds them one at a time)")
+    parser.add_argument("--chunk", action="store_true",
+                        help="Also store overlapping passages in the passage collection (needs --batch-size)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-check the stored articles with conditional GETs instead of crawling")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0,
+                        help="Seconds between saves of the crawl frontier")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Discard the saved crawl checkpoint instead of resuming it")
+    parser.add_argument("--parser", choices=PARSERS, default=DEFAULT_PARSER, help="HTML parser, see extract.py")
+    parser.add_argument("--extract-workers", type=int, default=0,
+                        help="Processes that parse pages (0 parses in the fetching thread)")
+    args = parser.parse_args()
+
+    scraper = ThoughtCoScraper(parser=args.parser)
+    if args.extract_workers > 0:
+        scraper.start_extract_pool(args.extract_workers)
+    if args.fresh:
+        scraper.checkpoint.clear()
+    if args.batch_size > 0:
+        scraper.start_pipeline(batch_size=args.batch_size, chunk_passages=args.chunk)
+    try:
+        if args.refresh:
+            scraper.refresh(max_workers=max(args.workers, 1), requests_per_second=args.rate, burst=args.burst)
+        elif args.workers > 0:
+            scraper.scrape_articles_concurrent(args.start_url, max_articles=args.max_articles,
+                                               max_workers=args.workers,
+                                               requests_per_second=args.rate, burst=args.burst,
+                                               checkpoint_interval=args.checkpoint_interval)
+        else:
+            scraper.scrape_articles(args.start_url, max_articles=args.max_articles,
+                                    checkpoint_interval=args.checkpoint_interval)
+    finally:
+        # Flush queued articles even on Ctrl-C
+        scraper.finish_pipeline()
+        scraper.stop_extract_pool()
+        # Rebuild the lexical index for hybrid retrieval
+        build_bm25_index(scraper.collection, os.path.join(scraper.db_path, INDEX_DIR))
@@ -0,0 +1,233 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+SESSION_TTL = 3600
+MAX_HISTORY = 50
+
+
+class MemorySessionStore:
+    """
+    Process-local sessions that expire `ttl` seconds after their last activity.
+
+    Expiry times go into a min-heap, so cleanup only looks at sessions that are actually due
+    instead of scanning every live session. Touching a session pushes a fresh heap entry; the
+    stale one is skipped when it reaches the top.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_history=MAX_HISTORY):
+        self.ttl = ttl
+        self.max_history = max_history
+        self.sessions = {}
+        self.expiry_heap = []
+        self.lock = threading.Lock()
+
+    def _touch(self, session_id, now):
+        session = self.sessions[session_id]
+        session["last_active"] = now
+        heapq.heappush(self.expiry_heap, (now + self.ttl, session_id))
+
+    def ensure(self, session_id=None):
+        """Return a live session id, creating the session if it is missing or expired"""
+        now = time.time()
+        with self.lock:
+            session_id = session_id or str(uuid.uuid4())
+            if session_id not in self.sessions:
+                self.sessions[session_id] = {
+                    "history": deque(maxlen=self.max_history),
+                    # Messages ever added, so indexes stay stable after old ones are dropped
+                    "count": 0,
+                    "last_active": now
+                }
+            self._touch(session_id, now)
+        return session_id
+
+    def append(self, session_id, role, content):
+        now = time.time()
+        with self.lock:
+            # The session may have expired while the answer was being generated
+            if session_id not in self.sessions:
+                return
+            session = self.sessions[session_id]
+            session["history"].append({"role": role, "content": content})
+            session["count"] += 1
+            self._touch(session_id, now)
+
+    def history(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return list(session["history"]) if session else []
+
+    def history_since(self, session_id, since=0):
+        """
+        Messages with index >= since. Returns (messages, index of the first one, total count);
+        indexes count every message of the session, including ones dropped from history.
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return [], 0, 0
+            first_kept = session["count"] - len(session["history"])
+            start = max(since, first_kept)
+            messages = list(session["history"])[start - first_kept:]
+            return messages, start, session["count"]
+
+    def cleanup(self):
+        """Remove expired sessions; costs O(log n) per expired or stale heap entry"""
+        now = time.time()
+        removed = 0
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self.expiry_heap)
+                session = self.sessions.get(session_id)
+                if session is not None and session["last_active"] + self.ttl <= now:
+                    del self.sessions[session_id]
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file that several worker processes can share.
+
+    Expiry uses an index on last_active, so cleanup deletes due sessions without scanning the
+    live ones. Writes use BEGIN IMMEDIATE and WAL mode so concurrent workers serialize safely.
+    """
+
+    def __init__(self, path, ttl=SESSION_TTL, max_history=MAX_HISTORY, cleanup_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_history = max_history
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = 0.0
+        self.local = threading.local()
+
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    last_active REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )
+            """)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, so each thread opens its own
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def ensure(self, session_id=None):
+        """Return a live session id, creating the session if it is missing or expired"""
+        session_id = session_id or str(uuid.uuid4())
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT last_active FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None and row[0] < now - self.ttl:
+                # Expired but not cleaned up yet: start over
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO sessions (id, last_active) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_active = excluded.last_active",
+                (session_id, now)
+            )
+        return session_id
+
+    def append(self, session_id, role, content):
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE sessions SET last_active = ? WHERE id = ?", (now, session_id)
+            ).rowcount
+            if not updated:
+                return
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                (session_id, seq, role, content)
+            )
+            # Keep only the most recent max_history messages
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq <= ?",
+                (session_id, seq - self.max_history)
+            )
+
+    def history(self, session_id):
+        rows = self._conn().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def history_since(self, session_id, since=0):
+        """Same as MemorySessionStore.history_since; seq is the 1-based message index"""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+            (session_id, since)
+        ).fetchall()
+        total = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        start = rows[0][0] - 1 if rows else total
+        return [{"role": role, "content": content} for _, role, content in rows], start, total
+
+    def cleanup(self):
+        """Remove expired sessions, at most once per cleanup_interval per process"""
+        now = time.time()
+        if now - self.last_cleanup < self.cleanup_interval:
+            return 0
+        self.last_cleanup = now
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE last_active < ?)",
+                (now - self.ttl,)
+            )
+            return conn.execute("DELETE FROM sessions WHERE last_active < ?", (now - self.ttl,)).rowcount
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_active >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+
+
+def create_session_store():
+    """Build the session store selected by SESSION_STORE ("memory" or "sqlite")"""
+    ttl = float(os.getenv("SESSION_TTL", str(SESSION_TTL)))
+    max_history = int(os.getenv("SESSION_MAX_HISTORY", str(MAX_HISTORY)))
+    if os.getenv("SESSION_STORE", "memory") == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "./sessions.sqlite3"), ttl, max_history)
+    return MemorySessionStore(ttl, max_history)
@@ -0,0 +1,206 @@
+import bisect
+import os
+import re
+import threading
+import time
+import unicodedata
+
+TITLES_FILE = "articles.txt"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Sorts after any character in a normalized key, so (prefix + END) bounds a prefix range
+END = "\uffff"
+
+
+def tokenize(text):
+    # Fold accents so "cafe" finds "Café"
+    text = unicodedata.normalize("NFKD", text.lower().replace("'", "")).encode("ascii", "ignore").decode()
+    return TOKEN_PATTERN.findall(text)
+
+
+def prefix_range(array, prefix):
+    """Slice bounds of the entries of a sorted array of (key, ...) tuples whose key starts with prefix"""
+    return bisect.bisect_left(array, (prefix,)), bisect.bisect_left(array, (prefix + END,))
+
+
+def merged(array, new_items):
+    """A sorted copy of array with new_items added; the arrays in use are never changed in place"""
+    if len(new_items) > 256:
+        return sorted(array + new_items)
+    # A few new titles are inserted into a copy instead of re-sorting every entry
+    array = list(array)
+    for item in new_items:
+        bisect.insort(array, item)
+    return array
+
+
+def append_title(title, path=TITLES_FILE):
+    """Add a newly stored article's title to the titles file the suggest index follows"""
+    with open(path, "a+b") as f:
+        # The shipped file has no trailing newline; don't glue the title onto its last line
+        f.seek(0, os.SEEK_END)
+        separator = b""
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            separator = b"" if f.read(1) == b"\n" else b"\n"
+        f.write(separator + (title.replace("\n", " ").strip() + "\n").encode("utf-8"))
+
+
+class TitlesFile:
+    """
+    Appends titles to the titles file unless an equivalent one (same words, ignoring case and
+    punctuation) is already in it, so re-crawled articles aren't listed twice
+    """
+
+    def __init__(self, path=TITLES_FILE):
+        self.path = path
+        self.keys = None
+        self.lock = threading.Lock()
+
+    def append(self, title):
+        """Append title if it is new; returns True if it was written"""
+        key = " ".join(tokenize(title))
+        with self.lock:
+            if self.keys is None:
+                self.keys = set()
+                if os.path.exists(self.path):
+                    with open(self.path, encoding="utf-8", errors="replace") as f:
+                        self.keys = {" ".join(tokenize(line)) for line in f}
+            if not key or key in self.keys:
+                return False
+            append_title(title, self.path)
+            self.keys.add(key)
+            return True
+
+
+class SuggestIndex:
+    """
+    Typeahead over article titles. Two sorted arrays are searched with bisect: the normalized
+    full titles, for titles starting with the typed text, and every (title token, entry), for
+    titles where any word starts with the last typed token (earlier typed tokens must be
+    prefixes of words of the title too).
+
+    Titles come from the titles file, read incrementally from where the last read stopped, and
+    from the collection metadata (which adds the URLs), re-read when its count changes. Sources
+    are checked at most every refresh_interval seconds; updates build new arrays and swap them
+    in, so lookups never wait on a rebuild.
+    """
+
+    def __init__(self, titles_path=TITLES_FILE, collection_loader=None, refresh_interval=30.0):
+        self.titles_path = titles_path
+        self.collection_loader = collection_loader
+        self.refresh_interval = refresh_interval
+        # (entries, sorted (key, entry index), sorted (token, entry index)); entries are {"title", "url", "words"}
+        self.snapshot = ([], [], [])
+        self.entry_positions = {}
+        self.titles_offset = 0
+        self.collection_count = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def add(self, titles):
+        """Add (title, url) pairs; a title seen before only gains its URL if it had none"""
+        with self.lock:
+            entries, keys, tokens = self.snapshot
+            entries = list(entries)
+            new_keys = []
+            new_tokens = []
+            for title, url in titles:
+                words = tokenize(title)
+                key = " ".join(words)
+                if not key:
+                    continue
+                position = self.entry_positions.get(key)
+                if position is not None:
+                    if url and not entries[position]["url"]:
+                        entries[position] = {**entries[position], "url": url}
+                    continue
+                position = self.entry_positions[key] = len(entries)
+                entries.append({"title": title.strip(), "url": url, "words": words})
+                new_keys.append((key, position))
+                new_tokens.extend((word, position) for word in set(words))
+            if new_keys:
+                keys = merged(keys, new_keys)
+                tokens = merged(tokens, new_tokens)
+            self.snapshot = (entries, keys, tokens)
+            return len(new_keys)
+
+    def refresh(self, force=False):
+        """Pick up titles added to the titles file or the collection since the last check"""
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < self.refresh_interval:
+            return 0
+        # Lookups during a refresh keep using the current arrays rather than waiting for it
+        if not self.refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            self.checked_at = now
+            return self._refresh(include_partial_line=force)
+        finally:
+            self.refresh_lock.release()
+
+    def _refresh(self, include_partial_line=False):
+        added = 0
+        if os.path.exists(self.titles_path):
+            # Bytes, so the offset stays right for titles that aren't ASCII
+            with open(self.titles_path, "rb") as f:
+                f.seek(self.titles_offset)
+                data = f.read()
+            # Only complete lines, except on a forced load, where the file's last line may just
+            # lack a newline; a line being written is otherwise read next time
+            complete = data if include_partial_line else data[:data.rfind(b"\n") + 1]
+            self.titles_offset += len(complete)
+            lines = complete.decode("utf-8", errors="replace").split("\n")
+            added += self.add((line, None) for line in lines if line.strip())
+
+        if self.collection_loader is not None:
+            try:
+                collection = self.collection_loader()
+                count = collection.count()
+                if count != self.collection_count:
+                    metadatas = collection.get(include=["metadatas"])['metadatas']
+                    added += self.add((metadata['title'], metadata.get('url')) for metadata in metadatas
+                                      if metadata.get('title'))
+                    self.collection_count = count
+            except Exception as e:
+                print(f"Can't read titles from the collection: {str(e)}")
+                self.collection_loader = None
+
+        if added:
+            print(f"Suggest index: {added} titles added, {len(self)} in total")
+        return added
+
+    def suggest(self, text, limit=8):
+        """Up to `limit` {"title", "url"} whose title starts with text, then those with a word that does"""
+        words = tokenize(text)
+        if not words:
+            return []
+        entries, keys, tokens = self.snapshot
+        matches = []
+        seen = set()
+
+        start, end = prefix_range(keys, " ".join(words))
+        for _, position in keys[start:min(end, start + limit)]:
+            seen.add(position)
+            matches.append(position)
+
+        if len(matches) < limit:
+            *leading, last = words
+            start, end = prefix_range(tokens, last)
+            for index in range(start, end):
+                position = tokens[index][1]
+                if position in seen:
+                    continue
+                seen.add(position)
+                title_words = entries[position]["words"]
+                if all(any(word.startswith(typed) for word in title_words) for typed in leading):
+                    matches.append(position)
+                    if len(matches) >= limit:
+                        break
+
+        return [{"title": entries[position]["title"], "url": entries[position]["url"]} for position in matches]
+
+    def __len__(self):
+        return len(self.snapshot[0])
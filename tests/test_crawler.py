@@ -0,0 +1,71 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import ConcurrentCrawler
+from extract import extract_html
+
+CONTENT = "Cells are the basic unit of life. " * 10
+
+
+def article(title, links):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return (f'<html><body><h1 class="article-heading type--lion">{title}</h1>'
+            f'<div class="loc article-content"><p>{CONTENT}</p>{anchors}</div></body></html>')
+
+
+PAGES = {
+    "/article-1": article("First", ["/article-2", "/article-3", "/about", "https://example.com/article-4"]),
+    "/article-2": article("Second", ["/article-1"]),
+    "/article-3": article("Third", ["/article-2", "/missing-5"]),
+    "/about": article("About", []),
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        page = PAGES.get(self.path)
+        self.send_response(200 if page else 404)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write((page or "").encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_crawler_follows_only_links_matching_the_url_pattern(fixture_server):
+    # The same pattern ThoughtCoScraper.url_pattern passes to extract_html
+    url_pattern = fixture_server.replace(".", r"\.") + r"/(article|missing)-\d+$"
+
+    def fetch_page(url, session):
+        response = session.get(url, timeout=5)
+        if response.status_code != 200:
+            return None, set()
+        title, content, links = extract_html(response.text, url, "html.parser", url_pattern)
+        return {"title": title, "content": content, "url": url}, links
+
+    stored = []
+
+    def store_article(article_data, on_stored):
+        stored.append(article_data)
+        on_stored()
+
+    crawler = ConcurrentCrawler(fetch_page, store_article, max_workers=2, requests_per_second=0)
+    crawler.crawl(f"{fixture_server}/article-1", max_articles=10)
+
+    assert sorted(article_data["title"] for article_data in stored) == ["First", "Second", "Third"]
+    assert crawler.url_status[f"{fixture_server}/article-2"] == "stored"
+    assert crawler.url_status[f"{fixture_server}/missing-5"] == "failed"
+    assert f"{fixture_server}/about" not in crawler.url_status
+    assert crawler.stats.errors == 1
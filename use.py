@@ -1,22 +1,20 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import numpy as np
 
+from model_registry import get_registry
+
 class VectorDBQuery:
     def __init__(self, db_path="./vector_db_new"):
+        # Shared models and clients (same embedding model as scraper)
+        registry = get_registry(db_path)
+
         # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
+        self.chroma_client = registry.get_chroma_client()
         
         # Initialize the embedding function (same as scraper)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        self.embedding_function = registry.get_embedding_function()
         
         # Get the collection
-        self.collection = self.chroma_client.get_collection(
-            name="thoughtco_articles",
-            embedding_function=self.embedding_function
-        )
+        self.collection = registry.get_collection()
 
     def search_similar(self, query_text, n_results=5):
         """Search for similar articles and return results with distances"""
@@ -1,7 +1,6 @@
-import chromadb
-from chromadb.utils import embedding_functions
 import numpy as np
-from sentence_transformers import CrossEncoder
+
+from model_registry import get_registry
 
 system_prompt = """
 You are an AI assistant tasked with providing detailed answers based solely on the given context. Your goal is to analyze the information provided and formulate a comprehensive, well-structured response to the question.
@@ -28,22 +27,20 @@ Important: Base your entire response solely on the information provided in the c
 
 class VectorDBQuery:
     def __init__(self, db_path="./vector_db_new"):
+        # Shared models and clients (same embedding model as scraper)
+        registry = get_registry(db_path)
+
         # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
+        self.chroma_client = registry.get_chroma_client()
         
         # Initialize the embedding function (same as scraper)
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
-        )
+        self.embedding_function = registry.get_embedding_function()
 
         # Initialize cross encoder for re-ranking
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.cross_encoder = registry.get_cross_encoder()
         
         # Get the collection
-        self.collection = self.chroma_client.get_collection(
-            name="thoughtco_articles",
-            embedding_function=self.embedding_function
-        )
+        self.collection = registry.get_collection()
 
     def search_similar(self, query_text, n_results=10, n_rerank=3):
         """